@@ -0,0 +1,56 @@
+import cv2 as cv
+
+
+class AppearanceSignature:
+    """
+    Compact appearance model of a target: a normalized hue/saturation histogram
+    of the center of its box. Cheap enough to compute for every candidate of a
+    detection pass and robust to the small pose changes between frames.
+    """
+
+    def __init__(self, bins=(16, 8), margin=0.2, learning_rate=0.1):
+        self.bins = bins
+        self.margin = margin  # fraction of the box cut away on every side (background)
+        self.learning_rate = learning_rate  # weight of a new observation in update()
+        self.hist = None
+
+    def compute(self, frame, bbox):
+        x, y, w, h = [int(v) for v in bbox]
+        dx, dy = int(w * self.margin), int(h * self.margin)
+        x1, y1 = max(0, x + dx), max(0, y + dy)
+        x2, y2 = min(frame.shape[1], x + w - dx), min(frame.shape[0], y + h - dy)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        hsv = cv.cvtColor(frame[y1:y2, x1:x2], cv.COLOR_BGR2HSV)
+        hist = cv.calcHist([hsv], [0, 1], None, list(self.bins), [0, 180, 0, 256])
+        return cv.normalize(hist, hist).flatten()
+
+    def set(self, frame, bbox):
+        self.hist = self.compute(frame, bbox)
+
+    def update(self, frame, bbox):
+        """Blends in a new observation of the target (lighting and pose changes)"""
+        hist = self.compute(frame, bbox)
+        if hist is None:
+            return
+        if self.hist is None:
+            self.hist = hist
+        else:
+            self.hist = (1 - self.learning_rate) * self.hist + self.learning_rate * hist
+
+    def clear(self):
+        self.hist = None
+
+    def similarity(self, frame, bbox):
+        """0 (different) to 1 (identical)"""
+        if self.hist is None:
+            return 0.0
+        hist = self.compute(frame, bbox)
+        if hist is None:
+            return 0.0
+        return 1.0 - cv.compareHist(self.hist, hist, cv.HISTCMP_BHATTACHARYYA)
+
+    def rank(self, frame, boxes):
+        """Returns (similarity, index) of boxes, best match first"""
+        scores = [(self.similarity(frame, box), i) for i, box in enumerate(boxes)]
+        return sorted(scores, reverse=True)
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+
+class DetectionCache:
+    """
+    Small bounded cache of all-class detection results keyed by frame id.
+    Oldest entries are evicted first once max_size is reached.
+    """
+
+    def __init__(self, max_size=8):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, frame_id):
+        if frame_id is None or frame_id not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(frame_id)
+        return self.entries[frame_id]
+
+    def put(self, frame_id, result):
+        if frame_id is None:
+            return
+        self.entries[frame_id] = result
+        self.entries.move_to_end(frame_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+
+def filter_detections(result, object_name=None):
+    """
+    Keeps only the detections of class object_name (all of them for None).
+    result - boxes,confidences,class_names
+    """
+    boxes, confidences, classNames = result
+    if object_name is None:
+        return list(boxes), list(confidences), list(classNames)
+    keep = [i for i, name in enumerate(classNames) if name == object_name]
+    return (
+        [boxes[i] for i in keep],
+        [confidences[i] for i in keep],
+        [classNames[i] for i in keep],
+    )
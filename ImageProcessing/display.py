@@ -0,0 +1,95 @@
+import time
+
+import cv2 as cv
+import numpy as np
+
+
+class Display:
+    """
+    Writes BGR frames straight into the pixel memory of a window surface.
+    Surface arrays (sdl2.ext.pixels3d, pygame.surfarray.pixels3d) are indexed
+    [x][y], so their transpose is a (height, width, channels) view of the
+    surface that a frame can be converted into without temporary arrays.
+    An Overlay passed to show is drawn straight onto the surface when the
+    display has a canvas (a plain view of the surface), otherwise onto a copy
+    of the frame. last_time and avg_time hold the display stage time in seconds.
+    """
+
+    def __init__(self):
+        self.last_time = 0.0
+        self.avg_time = None
+        self.canvas = None
+
+    def show(self, image, overlay=None):
+        start = time.perf_counter()
+        if overlay is not None and self.canvas is None:
+            image = overlay.render(image)
+        self.write(image)
+        if overlay is not None and self.canvas is not None:
+            overlay.draw(self.canvas)
+        self.last_time = time.perf_counter() - start
+        if self.avg_time is None:
+            self.avg_time = self.last_time
+        else:
+            self.avg_time = 0.9 * self.avg_time + 0.1 * self.last_time
+        return self.last_time
+
+    def write(self, image):
+        raise NotImplementedError
+
+    @staticmethod
+    def fit(image, shape):
+        # only when the window and frame sizes differ
+        if image.shape[:2] != shape[:2]:
+            image = cv.resize(image, (shape[1], shape[0]))
+        return image
+
+
+class BGRADisplay(Display):
+    """
+    For 32 bit BGRA surfaces such as the SDL window surface. mirror flips the
+    frame horizontally. OpenCV only writes into contiguous arrays, so a
+    reversed (or otherwise strided) view gets the frame converted into a
+    scratch buffer and copied over, one extra copy per frame.
+    """
+
+    def __init__(self, surface_array, mirror=False):
+        super().__init__()
+        self.target = surface_array.transpose(1, 0, 2)
+        if mirror:
+            self.target = self.target[:, ::-1]
+        self.zero_copy = self.target.flags.c_contiguous
+        self.scratch = None
+        if self.zero_copy:
+            # overlays go directly onto the surface, otherwise they are drawn on a
+            # copy of the frame and shown (mirrored) along with it
+            self.canvas = self.target
+
+    def write(self, image):
+        image = self.fit(image, self.target.shape)
+        if self.zero_copy:
+            cv.cvtColor(image, cv.COLOR_BGR2BGRA, dst=self.target)
+            return
+        if self.scratch is None:
+            self.scratch = np.empty(self.target.shape[:2] + (4,), dtype=self.target.dtype)
+        cv.cvtColor(image, cv.COLOR_BGR2BGRA, dst=self.scratch)
+        np.copyto(self.target, self.scratch[:, :, : self.target.shape[2]])
+
+
+class RGBDisplay(Display):
+    """
+    For surfaces exposed as RGB views (pygame). get_view returns the surface
+    array; it is requested per frame because pygame keeps the surface locked
+    while the view exists.
+    """
+
+    def __init__(self, get_view):
+        super().__init__()
+        self.get_view = get_view
+
+    def write(self, image):
+        target = self.get_view().transpose(1, 0, 2)
+        image = self.fit(image, target.shape)
+        # reversed channel view, BGR -> RGB without a copy
+        np.copyto(target, image[:, :, ::-1])
+        del target
@@ -0,0 +1,64 @@
+import cv2 as cv
+import numpy as np
+
+# Tello camera: 960 px over a horizontal field of view of about 82.6 degrees
+TELLO_PIXELS_PER_DEGREE = 960 / 82.6
+
+
+def yaw_difference(yaw, previous):
+    """Signed yaw change in degrees, taking the +-180 wrap into account"""
+    return (yaw - previous + 180) % 360 - 180
+
+
+class EgoMotionTracker:
+    """
+    Compensates the image shift caused by the drone yawing before the tracker
+    sees the frame. The yaw change since the tracker was initialized is turned
+    into a horizontal pixel offset, the frame is shifted back by it so the
+    target stays where the tracker searches, and the resulting box is moved
+    into frame coordinates again. Once the offset gets large the tracker is
+    re-anchored on the current frame so the target never leaves its view.
+    pixels_per_degree and max_offset are in pixels of a frame_width wide frame;
+    a smaller frame (wrapped in a ScaledTracker, which then also passes the yaw
+    through) is shifted by the same angle, so the warp runs at tracker scale.
+    """
+
+    def __init__(self, tracker, pixels_per_degree=TELLO_PIXELS_PER_DEGREE, max_offset=240, frame_width=960):
+        self.tracker = tracker
+        self.pixels_per_degree = pixels_per_degree  # negative if the yaw sign is reversed
+        self.max_offset = max_offset
+        self.frame_width = frame_width
+        self.offset = 0.0  # frame_width pixels
+        self.yaw = None
+
+    def init(self, frame, bbox, yaw=None):
+        self.offset = 0.0
+        self.yaw = yaw
+        self.tracker.init(frame, bbox)
+
+    def update(self, frame, yaw=None):
+        if yaw is not None and self.yaw is not None:
+            # yawing clockwise moves the scene to the left
+            self.offset -= yaw_difference(yaw, self.yaw) * self.pixels_per_degree
+        if yaw is not None:
+            self.yaw = yaw
+        offset = self.offset * frame.shape[1] / self.frame_width
+        if abs(offset) < 1:
+            return self.tracker.update(frame)
+        shift = np.float32([[1, 0, -offset], [0, 1, 0]])
+        stabilized = cv.warpAffine(
+            frame,
+            shift,
+            (frame.shape[1], frame.shape[0]),
+            borderMode=cv.BORDER_REPLICATE,
+        )
+        ok, bbox = self.tracker.update(stabilized)
+        if ok:
+            bbox = (bbox[0] + offset, bbox[1], bbox[2], bbox[3])
+            if abs(self.offset) > self.max_offset:
+                self.init(frame, bbox, self.yaw)
+        return ok, bbox
+
+    def __getattr__(self, name):
+        # confidence, last_cost, name, ... of the wrapped tracker
+        return getattr(self.tracker, name)
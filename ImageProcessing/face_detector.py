@@ -0,0 +1,98 @@
+import cv2 as cv
+
+
+class FaceDetector:
+    """
+    Haar cascade face detector that avoids full resolution scans.
+    The frame is converted to gray once at a reduced scale. If a face was found
+    before, only a region around it is searched, with min/max sizes derived from
+    its size; on a miss the whole (downscaled) frame is scanned at every scale in
+    full_scales until a face is found.
+    """
+
+    def __init__(
+        self,
+        cascade_file="haarcascade_frontalface_default.xml",
+        roi_scale=0.5,
+        full_scales=(0.5,),
+        scale_factor=1.3,
+        min_neighbors=5,
+        roi_margin=1.0,
+        size_tolerance=0.5,
+        min_size=(20, 20),
+    ):
+        self.cascade = cv.CascadeClassifier(cascade_file)
+        self.roi_scale = roi_scale  # frame scale used for the search around the last face
+        self.full_scales = full_scales  # frame scales tried in order for a full scan
+        self.scale_factor = scale_factor  # detectMultiScale pyramid step
+        self.min_neighbors = min_neighbors
+        self.roi_margin = roi_margin  # ROI extends this many face sizes around the last face
+        self.size_tolerance = size_tolerance  # allowed relative size change inside the ROI
+        self.min_size = min_size  # smallest face (in scaled pixels) of a full scan
+        self.last_face = None
+        self.roi_hits = 0
+        self.full_scans = 0
+
+    def reset(self):
+        self.last_face = None
+
+    def gray(self, frame, scale):
+        if scale != 1.0:
+            frame = cv.resize(frame, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+        if frame.ndim == 3:
+            frame = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+        return frame
+
+    def detect(self, frame):
+        """Returns the faces as a list of (x, y, w, h) in frame coordinates"""
+        faces = []
+        if self.last_face is not None:
+            faces = self.detect_roi(frame)
+            if faces:
+                self.roi_hits += 1
+        if not faces:
+            self.full_scans += 1
+            for scale in self.full_scales:
+                faces = self.detect_scaled(self.gray(frame, scale), scale, (0, 0), self.min_size, (0, 0))
+                if faces:
+                    break
+        self.last_face = faces[0] if faces else None
+        return faces
+
+    def detect_roi(self, frame):
+        x, y, w, h = self.last_face
+        mx, my = w * self.roi_margin, h * self.roi_margin
+        x1, y1 = int(max(0, x - mx)), int(max(0, y - my))
+        x2 = int(min(frame.shape[1], x + w + mx))
+        y2 = int(min(frame.shape[0], y + h + my))
+        if x2 <= x1 or y2 <= y1:
+            return []
+        s = self.roi_scale
+        side = min(w, h) * s
+        min_size = int(side * (1 - self.size_tolerance))
+        max_size = int(side * (1 + self.size_tolerance)) + 1
+        return self.detect_scaled(
+            self.gray(frame[y1:y2, x1:x2], s),
+            s,
+            (x1, y1),
+            (max(1, min_size),) * 2,
+            (max_size,) * 2,
+        )
+
+    def detect_scaled(self, gray, scale, origin, min_size, max_size):
+        """max_size (0, 0) means no upper limit"""
+        found = self.cascade.detectMultiScale(
+            gray, self.scale_factor, self.min_neighbors, minSize=min_size, maxSize=max_size
+        )
+        return [
+            (
+                int(fx / scale) + origin[0],
+                int(fy / scale) + origin[1],
+                int(fw / scale),
+                int(fh / scale),
+            )
+            for (fx, fy, fw, fh) in found
+        ]
+
+    def stats(self):
+        return {"roi_hits": self.roi_hits, "full_scans": self.full_scans}
@@ -0,0 +1,88 @@
+import copy
+
+import numpy as np
+
+
+class BoxKalmanFilter:
+    """
+    Constant velocity Kalman filter over the box center and size.
+    State is [cx, cy, w, h, vcx, vcy, vw, vh] in pixels and pixels per second,
+    time steps come from the frame timestamps. Used to predict where the target
+    will be when a command reaches the drone and to bridge short tracker dropouts.
+    """
+
+    def __init__(self, center_noise=300.0, size_noise=100.0, measurement_noise=5.0, max_coast=0.5):
+        self.center_noise = center_noise  # acceleration noise of the center (px/s^2)
+        self.size_noise = size_noise  # acceleration noise of the size (px/s^2)
+        self.R = np.eye(4) * measurement_noise ** 2
+        self.H = np.hstack([np.eye(4), np.zeros((4, 4))])
+        self.max_coast = max_coast  # seconds the filter may run without measurements
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.P = None
+        self.t = None
+        self.last_correction = None
+
+    @property
+    def initialized(self):
+        return self.x is not None
+
+    @staticmethod
+    def to_measurement(bbox):
+        x, y, w, h = [float(v) for v in bbox]
+        return np.array([x + w / 2, y + h / 2, w, h])
+
+    def transition(self, dt):
+        F = np.eye(8)
+        F[:4, 4:] = np.eye(4) * dt
+        # white noise acceleration model
+        q = np.array([self.center_noise, self.center_noise, self.size_noise, self.size_noise]) ** 2
+        Q = np.zeros((8, 8))
+        Q[:4, :4] = np.diag(q * dt ** 3 / 3)
+        Q[:4, 4:] = np.diag(q * dt ** 2 / 2)
+        Q[4:, :4] = np.diag(q * dt ** 2 / 2)
+        Q[4:, 4:] = np.diag(q * dt)
+        return F, Q
+
+    def predict(self, t):
+        """Advances the state to time t"""
+        if self.x is None or t <= self.t:
+            return
+        F, Q = self.transition(t - self.t)
+        self.x = F.dot(self.x)
+        self.P = F.dot(self.P).dot(F.T) + Q
+        self.t = t
+
+    def correct(self, bbox, t):
+        """Updates the filter with a box measured on the frame captured at t"""
+        z = self.to_measurement(bbox)
+        if self.x is None:
+            self.x = np.concatenate([z, np.zeros(4)])
+            self.P = np.diag(np.concatenate([np.diag(self.R), np.full(4, 500.0 ** 2)]))
+            self.t = t
+            self.last_correction = t
+            return
+        self.predict(t)
+        y = z - self.H.dot(self.x)
+        S = self.H.dot(self.P).dot(self.H.T) + self.R
+        K = self.P.dot(self.H.T).dot(np.linalg.inv(S))
+        self.x = self.x + K.dot(y)
+        self.P = (np.eye(8) - K.dot(self.H)).dot(self.P)
+        self.last_correction = max(self.last_correction, t)
+
+    def bbox_at(self, t):
+        """Box extrapolated to time t, the filter state is not changed"""
+        dt = max(0.0, t - self.t)
+        cx, cy, w, h = self.x[:4] + self.x[4:] * dt
+        w, h = max(1.0, w), max(1.0, h)
+        return (cx - w / 2, cy - h / 2, w, h)
+
+    def can_coast(self, t):
+        """True while the last measurement is recent enough to trust a prediction"""
+        return self.x is not None and t - self.last_correction <= self.max_coast
+
+    def copy(self):
+        """Independent copy, e.g. to hand the current estimate to another thread"""
+        return copy.deepcopy(self)
@@ -0,0 +1,77 @@
+import time
+
+import cv2 as cv
+
+
+class MotionGate:
+    """
+    Cheap change detector placed in front of the expensive detectors.
+    Frames are reduced to a small grayscale thumbnail and compared with the
+    thumbnail of the frame the cached result was computed on. While the scene
+    stays (almost) the same the cached result is returned instead of running
+    the detector again, for at most max_reuse calls and max_age seconds.
+    """
+
+    def __init__(self, threshold=4.0, size=(32, 24), max_reuse=25, max_age=1.0, clock=time.monotonic):
+        self.threshold = threshold  # mean absolute difference (0-255) below which a frame is "static"
+        self.size = size  # thumbnail size (width, height)
+        self.max_reuse = max_reuse  # force a fresh result after this many reuses
+        self.max_age = max_age  # seconds a result may be reused, slow changes add up below the threshold
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.reset()
+
+    def reset(self):
+        self.reference = None
+        self.result = None
+        self.key = None
+        self.reused = 0
+        self.computed = None
+
+    def thumbnail(self, frame):
+        small = cv.resize(frame, self.size, interpolation=cv.INTER_AREA)
+        if small.ndim == 3:
+            small = cv.cvtColor(small, cv.COLOR_BGR2GRAY)
+        return small
+
+    def difference(self, thumb):
+        if self.reference is None:
+            return float("inf")
+        return float(cv.absdiff(thumb, self.reference).mean())
+
+    def run(self, frame, detect, key=None, force=False):
+        """
+        Returns detect(frame), or the previous result if frame hardly changed
+        since it was computed. key distinguishes calls whose results are not
+        interchangeable (e.g. different object names). force always runs detect,
+        for callers that already know the previous result is no longer good.
+        """
+        thumb = self.thumbnail(frame)
+        now = self.clock()
+        if (
+            not force
+            and self.result is not None
+            and key == self.key
+            and self.reused < self.max_reuse
+            and now - self.computed < self.max_age
+            and self.difference(thumb) < self.threshold
+        ):
+            self.hits += 1
+            self.reused += 1
+            return self.result
+        self.misses += 1
+        self.result = detect(frame)
+        self.reference = thumb
+        self.key = key
+        self.reused = 0
+        self.computed = now
+        return self.result
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,165 @@
+import itertools
+import time
+
+INF = float("inf")
+
+
+def iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    x1 = max(a[0], b[0])
+    y1 = max(a[1], b[1])
+    x2 = min(a[0] + a[2], b[0] + b[2])
+    y2 = min(a[1] + a[3], b[1] + b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def linear_assignment(cost):
+    """
+    Hungarian algorithm. cost is a list of rows, returns the [(row, col)] pairs
+    of the assignment with the lowest total cost.
+    """
+    if not cost or not cost[0]:
+        return []
+    transposed = len(cost) > len(cost[0])
+    if transposed:
+        cost = [list(col) for col in zip(*cost)]
+    n, m = len(cost), len(cost[0])
+    # potentials and matching over 1-based indices, column 0 is a sentinel
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [INF] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            delta = INF
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    pairs = [(p[j] - 1, j - 1) for j in range(1, m + 1) if p[j] != 0]
+    if transposed:
+        pairs = [(col, row) for row, col in pairs]
+    return sorted(pairs)
+
+
+class Track:
+    """A tracked object with a stable id and a constant velocity motion model"""
+
+    def __init__(self, track_id, bbox, timestamp):
+        self.id = track_id
+        self.bbox = tuple(float(v) for v in bbox)
+        self.velocity = (0.0, 0.0)  # box center velocity in pixels per second
+        self.timestamp = timestamp
+        self.hits = 1
+        self.misses = 0
+        self.matched = True  # matched to a detection in the last update
+
+    def center(self):
+        return (self.bbox[0] + self.bbox[2] / 2, self.bbox[1] + self.bbox[3] / 2)
+
+    def predict(self, timestamp):
+        """Box expected at timestamp"""
+        dt = max(0.0, timestamp - self.timestamp)
+        x, y, w, h = self.bbox
+        return (x + self.velocity[0] * dt, y + self.velocity[1] * dt, w, h)
+
+    def correct(self, bbox, timestamp):
+        dt = timestamp - self.timestamp
+        if dt > 0:
+            old = self.center()
+            new = (bbox[0] + bbox[2] / 2, bbox[1] + bbox[3] / 2)
+            velocity = ((new[0] - old[0]) / dt, (new[1] - old[1]) / dt)
+            # smooth the velocity, a single noisy box shouldn't dominate
+            self.velocity = (
+                0.5 * self.velocity[0] + 0.5 * velocity[0],
+                0.5 * self.velocity[1] + 0.5 * velocity[1],
+            )
+        self.bbox = tuple(float(v) for v in bbox)
+        self.timestamp = timestamp
+
+
+class MultiObjectTracker:
+    """
+    SORT-style multi object tracker. Detections are associated to the predicted
+    boxes of the existing tracks by IoU with Hungarian matching, unmatched
+    detections start new tracks and tracks unmatched for more than max_misses
+    updates are dropped. Track ids never change, so a target can be followed
+    across detector runs by its id.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_misses=2, min_hits=1):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.min_hits = min_hits  # matches needed before a track is reported
+        self.tracks = []
+        self.ids = itertools.count(1)
+
+    def update(self, boxes, timestamp=None):
+        """Associates the detected boxes, returns the confirmed tracks"""
+        timestamp = time.time() if timestamp is None else timestamp
+        predicted = [track.predict(timestamp) for track in self.tracks]
+        cost = [[1.0 - iou(p, box) for box in boxes] for p in predicted]
+        matched_tracks = set()
+        matched_boxes = set()
+        for t, b in linear_assignment(cost):
+            if 1.0 - cost[t][b] >= self.iou_threshold:
+                matched_tracks.add(t)
+                matched_boxes.add(b)
+                self.tracks[t].correct(boxes[b], timestamp)
+                self.tracks[t].hits += 1
+                self.tracks[t].misses = 0
+        for t, track in enumerate(self.tracks):
+            track.matched = t in matched_tracks
+            if not track.matched:
+                track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+        for b, box in enumerate(boxes):
+            if b not in matched_boxes:
+                self.tracks.append(Track(next(self.ids), box, timestamp))
+        return self.confirmed()
+
+    def update_track(self, track_id, bbox, timestamp=None):
+        """Feeds a box from a single object tracker into the track with track_id"""
+        track = self.get(track_id)
+        if track is not None:
+            track.correct(bbox, time.time() if timestamp is None else timestamp)
+        return track
+
+    def confirmed(self):
+        return [track for track in self.tracks if track.hits >= self.min_hits]
+
+    def get(self, track_id):
+        for track in self.tracks:
+            if track.id == track_id:
+                return track
+        return None
+
+    def clear(self):
+        self.tracks = []
@@ -0,0 +1,98 @@
+from collections import OrderedDict
+
+import cv2 as cv
+import numpy as np
+
+
+class Overlay:
+    """
+    Annotation layer kept apart from the video frames. Boxes and labels are
+    recorded as draw operations during the frame and only drawn on the
+    displayed image, so detectors and trackers always work on clean frames.
+    Rendered text is cached as pixel offsets, a label that did not change
+    since an earlier frame is composited without rasterizing it again.
+    """
+
+    def __init__(self, font=cv.FONT_HERSHEY_SIMPLEX, cache_size=256):
+        self.font = font
+        self.cache_size = cache_size
+        self.text_cache = OrderedDict()
+        self.buffer = None
+        self.hits = 0
+        self.misses = 0
+        self.clear()
+
+    def clear(self):
+        """Drops the operations of the previous frame"""
+        self.ops = []
+
+    def rectangle(self, bbox, color, thickness=2):
+        """bbox is (x, y, w, h)"""
+        x, y, w, h = [int(v) for v in bbox]
+        self.ops.append(("rectangle", (x, y), (x + w, y + h), color, thickness))
+
+    def text(self, text, org, color, scale=0.75, thickness=1):
+        """org is the bottom left corner of the text, as in cv.putText"""
+        self.ops.append(("text", str(text), (int(org[0]), int(org[1])), color, scale, thickness))
+
+    def detections(self, boxes, confidences, class_names):
+        """Yolo boxes with their class:confidence label"""
+        for box, conf, name in zip(boxes, confidences, class_names):
+            x, y, w, h = [int(v) for v in box]
+            self.ops.append(("rectangle", (x, y), (x + w, y + h), (0, 0, 255), 1))
+            label = "%s:%.2f" % (name, conf)
+            label_height = cv.getTextSize(label, self.font, 0.5, 1)[0][1]
+            self.text(label, (x, max(y, label_height)), (255, 255, 255), scale=0.5)
+
+    def rendered(self, text, scale, thickness):
+        """Pixel offsets of text relative to its origin, (dy, dx)"""
+        key = (text, scale, thickness)
+        offsets = self.text_cache.get(key)
+        if offsets is not None:
+            self.hits += 1
+            self.text_cache.move_to_end(key)
+            return offsets
+        self.misses += 1
+        (width, height), baseline = cv.getTextSize(text, self.font, scale, thickness)
+        pad = thickness + 1
+        mask = np.zeros((height + baseline + 2 * pad, width + 2 * pad), dtype=np.uint8)
+        cv.putText(mask, text, (pad, height + pad), self.font, scale, 255, thickness)
+        dy, dx = np.nonzero(mask)
+        offsets = (dy - (height + pad), dx - pad)
+        self.text_cache[key] = offsets
+        if len(self.text_cache) > self.cache_size:
+            self.text_cache.popitem(last=False)
+        return offsets
+
+    def draw(self, image):
+        """Draws the recorded operations onto image in place (BGR or BGRA)"""
+        height, width = image.shape[:2]
+        for op in self.ops:
+            color = op[3]
+            if image.shape[2] == 4:
+                color = tuple(color) + (255,)
+            if op[0] == "rectangle":
+                cv.rectangle(image, op[1], op[2], color, op[4])
+                continue
+            dy, dx = self.rendered(op[1], op[4], op[5])
+            ys, xs = dy + op[2][1], dx + op[2][0]
+            inside = (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width)
+            image[ys[inside], xs[inside]] = color
+        return image
+
+    def render(self, frame):
+        """Returns a copy of frame with the overlay, frame itself stays clean"""
+        if self.buffer is None or self.buffer.shape != frame.shape:
+            self.buffer = np.empty_like(frame)
+        np.copyto(self.buffer, frame)
+        return self.draw(self.buffer)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "ops": len(self.ops),
+            "cached_texts": len(self.text_cache),
+            "text_hits": self.hits,
+            "text_misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
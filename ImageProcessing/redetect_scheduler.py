@@ -0,0 +1,65 @@
+from ImageProcessing.motion_gate import MotionGate
+
+
+class RedetectScheduler:
+    """
+    Decides when the detector has to run again while a tracker follows the target.
+    Re-detection is requested when the tracker confidence drops, the box size
+    drifts away from the last detection, the whole frame moves a lot, or when
+    the time since the last detection exceeds an interval that grows with the
+    tracker confidence (min_interval at 0, max_interval at 1).
+    """
+
+    def __init__(
+        self,
+        min_interval=0.5,
+        max_interval=4.0,
+        min_confidence=0.4,
+        max_size_change=0.4,
+        max_motion=25.0,
+    ):
+        self.min_interval = min_interval  # never re-detect more often than this (seconds)
+        self.max_interval = max_interval  # always re-detect after this (seconds)
+        self.min_confidence = min_confidence
+        self.max_size_change = max_size_change  # relative change of the box area
+        self.max_motion = max_motion  # mean thumbnail difference between consecutive frames
+        # only used for its cheap frame thumbnails
+        self.thumbs = MotionGate()
+        self.reset()
+
+    def reset(self):
+        self.last_detection = None
+        self.detected_area = None
+        self.reason = None
+
+    def detected(self, bbox, t):
+        """Records a detector run that produced bbox at time t"""
+        self.last_detection = t
+        self.detected_area = max(1.0, bbox[2] * bbox[3])
+
+    def frame_motion(self, frame):
+        """Mean thumbnail difference to the previous frame"""
+        thumb = self.thumbs.thumbnail(frame)
+        motion = 0.0 if self.thumbs.reference is None else self.thumbs.difference(thumb)
+        self.thumbs.reference = thumb
+        return motion
+
+    def should_redetect(self, t, confidence, bbox, frame=None):
+        """Returns True when the detector should run on the current frame, the cause is kept in reason"""
+        motion = self.frame_motion(frame) if frame is not None else 0.0
+        self.reason = None
+        if self.last_detection is None or bbox is None:
+            self.reason = "no detection"
+            return True
+        elapsed = t - self.last_detection
+        if elapsed < self.min_interval:
+            return False
+        if confidence < self.min_confidence:
+            self.reason = "low confidence"
+        elif abs(bbox[2] * bbox[3] - self.detected_area) / self.detected_area > self.max_size_change:
+            self.reason = "size change"
+        elif motion > self.max_motion:
+            self.reason = "frame motion"
+        elif elapsed > self.min_interval + (self.max_interval - self.min_interval) * confidence:
+            self.reason = "interval"
+        return self.reason is not None
@@ -0,0 +1,323 @@
+import time
+
+import cv2 as cv
+import numpy as np
+
+
+def create_cv_tracker(name):
+    """Creates an OpenCV tracker (KCF, CSRT, MOSSE) for both new and legacy OpenCV APIs"""
+    factory = getattr(cv, "Tracker{}_create".format(name), None)
+    if factory is None and hasattr(cv, "legacy"):
+        factory = getattr(cv.legacy, "Tracker{}_create".format(name), None)
+    if factory is None:
+        raise ValueError("OpenCV tracker {} is not available".format(name))
+    return factory()
+
+
+def normalized_correlation(a, b):
+    """Zero mean normalized cross correlation of two equally sized float patches, -1..1"""
+    a = a - a.mean()
+    b = b - b.mean()
+    norm = np.sqrt(float((a * a).sum()) * float((b * b).sum()))
+    if norm < 1e-6:
+        # a flat patch has no structure to correlate, compare the brightness instead
+        return 1.0 - float(np.abs(a.mean() - b.mean())) / 255.0
+    return float((a * b).sum()) / norm
+
+
+class Tracker:
+    """
+    Common interface of all tracker backends.
+    init(frame, bbox) starts tracking bbox, update(frame) returns ok,bbox.
+    After every update last_cost holds the update time (seconds) and
+    confidence a 0-1 estimate of the tracking quality: the normalized cross
+    correlation of the box contents with a template taken at init (slowly
+    adapted while the match is good), times a penalty for sudden box size
+    changes. Fixed size trackers (KCF, MOSSE) only get a meaningful value from
+    the template part.
+    """
+
+    name = None
+    template_size = (24, 24)  # width, height the patches are compared at
+    template_rate = 0.05  # template adaptation per update above template_min_score
+    template_min_score = 0.7
+
+    def __init__(self):
+        self.last_cost = 0.0
+        self.avg_cost = None
+        self.confidence = 0.0
+        self.bbox = None
+        self.template = None
+
+    def init(self, frame, bbox):
+        self.bbox = tuple(bbox)
+        self.confidence = 1.0
+        self.template = self._patch(frame, self.bbox)
+        self._init(frame, self.bbox)
+
+    def update(self, frame):
+        start = time.perf_counter()
+        ok, bbox = self._update(frame)
+        self.last_cost = time.perf_counter() - start
+        # exponential average, smooths out single slow frames
+        if self.avg_cost is None:
+            self.avg_cost = self.last_cost
+        else:
+            self.avg_cost = 0.8 * self.avg_cost + 0.2 * self.last_cost
+        if ok:
+            self.confidence = self._confidence(frame, bbox)
+            self.bbox = tuple(bbox)
+        else:
+            self.confidence = 0.0
+        return ok, bbox
+
+    def _init(self, frame, bbox):
+        raise NotImplementedError
+
+    def _update(self, frame):
+        raise NotImplementedError
+
+    def _patch(self, frame, bbox):
+        """Gray float32 contents of bbox at template_size, None if the box is outside the frame"""
+        x, y, w, h = bbox
+        x1, y1 = max(0, int(x)), max(0, int(y))
+        x2, y2 = min(frame.shape[1], int(x + w)), min(frame.shape[0], int(y + h))
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return None
+        patch = frame[y1:y2, x1:x2]
+        if patch.ndim == 3:
+            patch = cv.cvtColor(patch, cv.COLOR_BGR2GRAY)
+        return cv.resize(patch, self.template_size, interpolation=cv.INTER_AREA).astype(np.float32)
+
+    def _appearance(self, frame, bbox):
+        """Similarity (0-1) of the box contents to the template, adapts the template on good matches"""
+        if self.template is None:
+            return 1.0
+        patch = self._patch(frame, bbox)
+        if patch is None:
+            return 0.0
+        score = max(0.0, normalized_correlation(patch, self.template))
+        if score >= self.template_min_score:
+            self.template += self.template_rate * (patch - self.template)
+        return score
+
+    def _confidence(self, frame, bbox):
+        """Default confidence: template similarity, penalized by sudden changes of the box size"""
+        appearance = self._appearance(frame, bbox)
+        if self.bbox is None:
+            return appearance
+        old_area = max(1.0, self.bbox[2] * self.bbox[3])
+        area = max(1.0, bbox[2] * bbox[3])
+        return appearance * min(old_area, area) / max(old_area, area)
+
+
+class OpenCVTracker(Tracker):
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self.tracker = None
+
+    def _init(self, frame, bbox):
+        # OpenCV trackers can't be re-initialized reliably, a new one is cheap
+        self.tracker = create_cv_tracker(self.name)
+        self.tracker.init(frame, tuple(int(v) for v in bbox))
+
+    def _update(self, frame):
+        return self.tracker.update(frame)
+
+
+class KCFTracker(OpenCVTracker):
+    def __init__(self):
+        super().__init__("KCF")
+
+
+class CSRTTracker(OpenCVTracker):
+    def __init__(self):
+        super().__init__("CSRT")
+
+
+class MOSSETracker(OpenCVTracker):
+    def __init__(self):
+        super().__init__("MOSSE")
+
+
+class OpticalFlowTracker(Tracker):
+    """
+    Sparse Lucas-Kanade optical flow on corners inside the box. The box is moved
+    by the median point displacement and scaled by the median change of point
+    spread. Confidence is the fraction of points that were tracked times the
+    template confidence of Tracker.
+    """
+
+    name = "FLOW"
+
+    def __init__(self, max_points=50, min_points=5):
+        super().__init__()
+        self.max_points = max_points
+        self.min_points = min_points
+        self.points = None
+        self.prev_gray = None
+        self.tracked_ratio = 0.0
+
+    def _gray(self, frame):
+        if frame.ndim == 3:
+            return cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+        return frame
+
+    def _find_points(self, gray, bbox):
+        x, y, w, h = [int(v) for v in bbox]
+        mask = np.zeros_like(gray)
+        mask[max(0, y) : y + h, max(0, x) : x + w] = 255
+        return cv.goodFeaturesToTrack(
+            gray, maxCorners=self.max_points, qualityLevel=0.01, minDistance=5, mask=mask
+        )
+
+    def _init(self, frame, bbox):
+        self.prev_gray = self._gray(frame)
+        self.points = self._find_points(self.prev_gray, bbox)
+
+    def _update(self, frame):
+        gray = self._gray(frame)
+        if self.points is None or len(self.points) < self.min_points:
+            self.prev_gray = gray
+            return False, self.bbox
+        new_points, status, _ = cv.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None)
+        good = status.flatten() == 1
+        self.tracked_ratio = float(good.sum()) / len(self.points)
+        if good.sum() < self.min_points:
+            self.prev_gray = gray
+            return False, self.bbox
+        old = self.points[good].reshape(-1, 2)
+        new = new_points[good].reshape(-1, 2)
+        dx, dy = np.median(new - old, axis=0)
+        old_spread = np.median(np.linalg.norm(old - old.mean(axis=0), axis=1))
+        new_spread = np.median(np.linalg.norm(new - new.mean(axis=0), axis=1))
+        scale = new_spread / old_spread if old_spread > 0 else 1.0
+        x, y, w, h = self.bbox
+        cx, cy = x + w / 2 + dx, y + h / 2 + dy
+        w, h = w * scale, h * scale
+        bbox = (cx - w / 2, cy - h / 2, w, h)
+        self.prev_gray = gray
+        self.points = new.reshape(-1, 1, 2)
+        if len(self.points) < self.max_points // 2:
+            # replenish points so the track doesn't starve
+            points = self._find_points(gray, bbox)
+            if points is not None:
+                self.points = points
+        return True, bbox
+
+    def _confidence(self, frame, bbox):
+        return self.tracked_ratio * super()._confidence(frame, bbox)
+
+
+TRACKERS = {
+    "CSRT": CSRTTracker,
+    "KCF": KCFTracker,
+    "MOSSE": MOSSETracker,
+    "FLOW": OpticalFlowTracker,
+}
+
+
+def create_tracker(name):
+    return TRACKERS[name]()
+
+
+class TrackerSelector:
+    """
+    Picks the tracker backend from a per-frame time budget and the current
+    tracking quality. Backends are ordered from most accurate/slowest to
+    fastest; the selector steps down when the measured update cost exceeds the
+    budget and steps back up when there is headroom and the quality dropped.
+    """
+
+    def __init__(
+        self,
+        budget=0.02,
+        order=("CSRT", "KCF", "MOSSE", "FLOW"),
+        min_confidence=0.5,
+        initial=None,
+    ):
+        self.budget = budget  # seconds per tracker update
+        self.order = list(order)
+        self.min_confidence = min_confidence
+        self.level = self.order.index(initial) if initial is not None else 0
+        self.tracker = None
+        # measured average cost per backend, used to decide whether an upgrade fits the budget
+        self.costs = {}
+
+    @property
+    def name(self):
+        return self.order[self.level]
+
+    def init(self, frame, bbox):
+        self.tracker = create_tracker(self.name)
+        self.tracker.init(frame, bbox)
+
+    def update(self, frame):
+        ok, bbox = self.tracker.update(frame)
+        self.costs[self.name] = self.tracker.avg_cost
+        if ok:
+            self.select(frame, bbox)
+        return ok, bbox
+
+    def select(self, frame, bbox):
+        level = self.level
+        if self.tracker.avg_cost > self.budget and level < len(self.order) - 1:
+            level += 1
+        elif self.tracker.confidence < self.min_confidence and level > 0:
+            better = self.costs.get(self.order[level - 1])
+            if better is None or better <= self.budget:
+                level -= 1
+        if level != self.level:
+            self.level = level
+            self.init(frame, bbox)
+
+    @property
+    def confidence(self):
+        return self.tracker.confidence if self.tracker is not None else 0.0
+
+    @property
+    def last_cost(self):
+        return self.tracker.last_cost if self.tracker is not None else 0.0
+
+
+class ScaledTracker:
+    """
+    Runs a tracker on a downscaled copy of the frame and rescales the boxes back
+    to full resolution, so the tracker cost follows the target size instead of
+    the frame size. With scale=None the scale is chosen on every init so that
+    the smaller side of the target becomes about target_size pixels. Extra
+    init/update arguments (the yaw of an EgoMotionTracker) are passed through.
+    """
+
+    def __init__(self, tracker, scale=0.5, target_size=64, min_scale=0.25):
+        self.tracker = tracker
+        self.fixed_scale = scale
+        self.target_size = target_size
+        self.min_scale = min_scale
+        self.scale = scale if scale is not None else 1.0
+
+    def choose_scale(self, bbox):
+        if self.fixed_scale is not None:
+            return self.fixed_scale
+        side = max(1.0, min(bbox[2], bbox[3]))
+        return min(1.0, max(self.min_scale, self.target_size / side))
+
+    def resize(self, frame):
+        if self.scale == 1.0:
+            return frame
+        return cv.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv.INTER_AREA)
+
+    def init(self, frame, bbox, **kwargs):
+        self.scale = self.choose_scale(bbox)
+        self.tracker.init(self.resize(frame), tuple(v * self.scale for v in bbox), **kwargs)
+
+    def update(self, frame, **kwargs):
+        ok, bbox = self.tracker.update(self.resize(frame), **kwargs)
+        if bbox is not None:
+            bbox = tuple(v / self.scale for v in bbox)
+        return ok, bbox
+
+    def __getattr__(self, name):
+        # confidence, last_cost, name, ... of the wrapped tracker
+        return getattr(self.tracker, name)
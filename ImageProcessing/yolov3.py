@@ -7,6 +7,8 @@ inpHeight = 416  # Height of network's input image
 import cv2 as cv
 import numpy as np
 import os
+from ImageProcessing.motion_gate import MotionGate
+from ImageProcessing.detection_cache import DetectionCache, filter_detections
 
 
 class Yolo:
@@ -19,6 +21,11 @@ class Yolo:
         classesFile = "./ImageProcessing/coco.names"
         self.classes = None
         self.model_initialized = False
+        # Reuse the last result while the scene is static (e.g. hovering)
+        self.motion_gate = MotionGate()
+        self.use_motion_gate = True
+        # All-class results of the last few frames, shared by every consumer
+        self.cache = DetectionCache()
 
         with open(classesFile, "rt") as f:
             self.classes = f.read().rstrip("\n").split("\n")
@@ -36,7 +43,10 @@ class Yolo:
         # Get the names of all the layers in the network
         layersNames = self.net.getLayerNames()
         # Get the names of the output layers, i.e. the layers with unconnected outputs
-        return [layersNames[i[0] - 1] for i in self.net.getUnconnectedOutLayers()]
+        return [
+            layersNames[i - 1]
+            for i in np.array(self.net.getUnconnectedOutLayers()).flatten()
+        ]
 
     def drawPred(self, frame, class_name, conf, left, top, right, bottom):
         # Draw a bounding box.
@@ -56,27 +66,63 @@ class Yolo:
         )
         return frame
 
-    def detect(self, image, object_name, return_img=False):
+    def detect(self, image, object_name, return_img=False, frame_id=None, force=False):
         """
         Returns: boxes,confidences,class_names,image(optional)
         boxes - list of (coordinates of) all objects [(x1,y1,x2,y2)]
+        object_name - class to keep, None keeps every class
+        frame_id - id of the frame, results are shared between calls with the same id
+        return_img - also return an annotated copy, image itself is not drawn on
+        force - run the network even if the motion gate would reuse the last result
 
         """
-        blob = cv.dnn.blobFromImage(
+        boxes, confidences, classNames = filter_detections(
+            self.detectAll(image, frame_id, force), object_name
+        )
+        if return_img:
+            return (
+                boxes,
+                confidences,
+                classNames,
+                self.draw_boxes(image.copy(), confidences, boxes, classNames),
+            )
+        return boxes, confidences, classNames
+
+    def detectAll(self, image, frame_id=None, force=False):
+        """
+        Returns all-class boxes,confidences,class_names for image. A frame is only
+        run through the network once, later calls are served from the cache.
+        force bypasses the motion gate (not the cache, it holds results of this very frame).
+        """
+        result = self.cache.get(frame_id)
+        if result is not None:
+            return result
+        if self.use_motion_gate:
+            result = self.motion_gate.run(image, self.detectObjects, force=force)
+        else:
+            result = self.detectObjects(image)
+        self.cache.put(frame_id, result)
+        return result
+
+    def detectObjects(self, image):
+        """
+        Runs the network on image, returns boxes,confidences,class_names of all classes
+        """
+        outs = self.forward(self.preprocess(image))
+        return self.postprocess(outs, image.shape[1], image.shape[0])
+
+    def preprocess(self, image):
+        return cv.dnn.blobFromImage(
             image, 1 / 255, (self.inpWidth, self.inpHeight), [0, 0, 0], 1, crop=False
         )
+
+    def forward(self, blob):
         # Sets the input to the network
         self.net.setInput(blob)
         # Runs the forward pass to get output of the output layers
-        outs = self.net.forward(self.getOutputsNames())
-        obj_ind = self.classes.index(object_name)
-
-        frameHeight = image.shape[0]
-        frameWidth = image.shape[1]
+        return self.net.forward(self.getOutputsNames())
 
-        classIds = []
-        confidences = []
-        boxes = []
+    def postprocess(self, outs, frameWidth, frameHeight):
         # Scan through all the bounding boxes output from the network and keep only the
         # ones with high confidence scores. Assign the box's class label as the class with the highest score.
         classIds = []
@@ -87,7 +133,7 @@ class Yolo:
                 scores = detection[5:]
                 classId = np.argmax(scores)
                 confidence = scores[classId]
-                if confidence > confThreshold and classId == obj_ind:
+                if confidence > confThreshold:
                     center_x = int(detection[0] * frameWidth)
                     center_y = int(detection[1] * frameHeight)
                     width = int(detection[2] * frameWidth)
@@ -99,18 +145,19 @@ class Yolo:
                     boxes.append([left, top, width, height])
 
         # Perform non maximum suppression to eliminate redundant overlapping boxes with
-        # lower confidences.
-        indices = cv.dnn.NMSBoxes(boxes, confidences, confThreshold, nmsThreshold)
-        boxes = [boxes[i[0]] for i in indices]
-        confidences = [confidences[i[0]] for i in indices]
-        classNames = [self.classes[classIds[i[0]]] for i in indices]
-        if return_img:
-            return (
-                boxes,
-                confidences,
-                classNames,
-                self.draw_boxes(image, confidences, boxes, classNames),
-            )
+        # lower confidences. Boxes are offset per class so that different classes never
+        # suppress each other.
+        offset = max(frameWidth, frameHeight) + 1
+        nms_boxes = [
+            [box[0] + classId * offset, box[1] + classId * offset, box[2], box[3]]
+            for box, classId in zip(boxes, classIds)
+        ]
+        indices = np.array(
+            cv.dnn.NMSBoxes(nms_boxes, confidences, confThreshold, nmsThreshold)
+        ).flatten()
+        boxes = [boxes[i] for i in indices]
+        confidences = [confidences[i] for i in indices]
+        classNames = [self.classes[classIds[i]] for i in indices]
         return boxes, confidences, classNames
 
     def draw_boxes(self, frame, confidences, boxes, object_name):
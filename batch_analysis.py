@@ -0,0 +1,258 @@
+# Post-flight analysis: yolo detection and multi object tracking over many recordings.
+#
+#   python batch_analysis.py flights/*.avi --output index.json
+#   python batch_analysis.py recordings/ --classes person dog --workers 6 --stride 2
+#
+# Every video is split into chunks starting at keyframes (listed with ffprobe when
+# available, otherwise fixed length chunks), the chunks are processed by a pool of
+# worker processes with one Yolo model each, and the per-chunk tracks are stitched
+# across chunk borders into one index of tracks per video. Inputs may be video
+# files, FlightRecorder directories or directories containing either.
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import cv2
+
+from ImageProcessing.detection_cache import filter_detections
+from ImageProcessing.multi_tracker import MultiObjectTracker, iou, linear_assignment
+from ImageProcessing.yolov3 import Yolo
+from djitellopy.recording import FlightRecording
+
+VIDEO_EXTENSIONS = (".avi", ".mp4", ".mkv", ".mov", ".h264")
+
+# per worker process, created by init_worker
+_yolo = None
+
+
+def find_inputs(paths):
+    """Video files and recording directories named by paths, directories are searched"""
+    found = []
+    for path in paths:
+        if os.path.isfile(os.path.join(path, "meta.json")):
+            found.append(path)
+        elif os.path.isdir(path):
+            entries = sorted(glob.glob(os.path.join(path, "*")))
+            found.extend(find_inputs([e for e in entries if os.path.isdir(e) or e.lower().endswith(VIDEO_EXTENSIONS)]))
+        elif os.path.isfile(path):
+            found.append(path)
+    return found
+
+
+def keyframes(path, ffprobe):
+    """Times (s) of the keyframes of a video, None if ffprobe is not available or fails"""
+    command = [
+        ffprobe, "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+        "-show_entries", "frame=pts_time", "-of", "csv=p=0", path,
+    ]
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    times = []
+    for line in output.split():
+        try:
+            times.append(float(line.strip(",")))
+        except ValueError:
+            pass
+    return times or None
+
+
+def plan_chunks(path, chunk_seconds, ffprobe):
+    """Returns (info, [(first, last)]) frame ranges, last exclusive, each starting at a keyframe"""
+    if os.path.isdir(path):
+        recording = FlightRecording(path)
+        count = recording.frame_count()
+        times = recording.frame_index["time"]
+        fps = (count - 1) / (times[-1] - times[0]) if count > 1 and times[-1] > times[0] else 30.0
+        starts = range(0, count, max(1, int(chunk_seconds * fps)))  # every recorded frame is a JPEG
+    else:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise IOError("Could not open {}".format(path))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        chunk_frames = max(1, int(chunk_seconds * fps))
+        key_times = keyframes(path, ffprobe)
+        if key_times is None:
+            starts = range(0, count, chunk_frames)
+        else:
+            starts = [0]
+            for t in key_times:
+                frame = int(round(t * fps))
+                if frame - starts[-1] >= chunk_frames and frame < count:
+                    starts.append(frame)
+    starts = list(starts)
+    chunks = [(first, last) for first, last in zip(starts, starts[1:] + [count]) if last > first]
+    return {"path": path, "fps": fps, "frames": count}, chunks
+
+
+def init_worker(threads):
+    global _yolo
+    # workers * threads should match the cores, OpenCV would start one thread per core in every worker
+    cv2.setNumThreads(threads)
+    _yolo = Yolo()
+    _yolo.initializeModel()
+
+
+def read_frames(path, first, last):
+    """Yields (frame_number, frame) of the range"""
+    if os.path.isdir(path):
+        recording = FlightRecording(path)
+        for i in range(first, last):
+            yield i, recording.frame(i)[1]
+        return
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    for i in range(first, last):
+        grabbed, frame = cap.read()
+        if not grabbed:
+            break
+        yield i, frame
+    cap.release()
+
+
+def process_chunk(job):
+    """Detects and tracks classes on one chunk, returns its tracks with chunk local ids"""
+    path, first, last, fps, classes, stride, use_motion_gate = job
+    start = time.perf_counter()
+    video_time = [first / fps]
+    _yolo.use_motion_gate = use_motion_gate
+    _yolo.motion_gate.reset()
+    # results are reused for a span of video time, not of processing time
+    _yolo.motion_gate.clock = lambda: video_time[0]
+    _yolo.cache.clear()  # frame numbers repeat between chunks of different videos
+    trackers = {name: MultiObjectTracker() for name in classes}
+    tracks = {}
+    frames = 0
+    for number, frame in read_frames(path, first, last):
+        frames += 1
+        if (number - first) % stride:
+            continue
+        video_time[0] = number / fps
+        result = _yolo.detectAll(frame, frame_id=number)
+        for name in classes:
+            boxes, confidences, _ = filter_detections(result, name)
+            confidence = {tuple(float(v) for v in box): conf for box, conf in zip(boxes, confidences)}
+            for track in trackers[name].update(boxes, number / fps):
+                if not track.matched:
+                    continue
+                key = "{}:{}".format(name, track.id)
+                entry = tracks.setdefault(key, {"class": name, "boxes": []})
+                entry["boxes"].append([number] + [round(v, 1) for v in track.bbox] + [
+                    round(float(confidence.get(track.bbox, 0.0)), 3)
+                ])
+    return {
+        "path": path,
+        "first": first,
+        "last": last,
+        "frames": frames,
+        "seconds": time.perf_counter() - start,
+        "tracks": list(tracks.values()),
+    }
+
+
+def stitch(chunks, stride, iou_threshold=0.3):
+    """Joins the tracks of consecutive chunks that continue across the border, returns the merged tracks"""
+    merged = []
+    open_tracks = []  # merged tracks still seen at the end of the previous chunk
+    for chunk in sorted(chunks, key=lambda c: c["first"]):
+        border = chunk["first"]
+        starting = [t for t in chunk["tracks"] if t["boxes"][0][0] < border + stride + 1]
+        cost = [
+            [1.0 - iou(old["boxes"][-1][1:5], new["boxes"][0][1:5]) if old["class"] == new["class"] else 1.0
+             for new in starting]
+            for old in open_tracks
+        ]
+        continued = {}
+        for o, n in linear_assignment(cost):
+            if 1.0 - cost[o][n] >= iou_threshold:
+                continued[id(starting[n])] = open_tracks[o]
+        for track in chunk["tracks"]:
+            previous = continued.get(id(track))
+            if previous is not None:
+                previous["boxes"].extend(track["boxes"])
+            else:
+                track = {"id": len(merged) + 1, "class": track["class"], "boxes": list(track["boxes"])}
+                merged.append(track)
+        end = chunk["last"] - 1
+        open_tracks = [t for t in merged if t["boxes"][-1][0] > end - stride - 1]
+    return merged
+
+
+def build_index(info, chunks, stride):
+    tracks = stitch(chunks, stride)
+    fps = info["fps"]
+    for track in tracks:
+        track["first_frame"] = track["boxes"][0][0]
+        track["last_frame"] = track["boxes"][-1][0]
+        track["first_time"] = round(track["first_frame"] / fps, 3)
+        track["last_time"] = round(track["last_frame"] / fps, 3)
+    return dict(info, chunks=len(chunks), seconds=sum(c["seconds"] for c in chunks), tracks=tracks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect and track objects in recorded flights with a process pool")
+    parser.add_argument("inputs", nargs="+", help="video files, recording directories or directories of them")
+    parser.add_argument("--output", default="index.json")
+    parser.add_argument("--classes", nargs="+", default=["person"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: cores)")
+    parser.add_argument("--threads", type=int, help="OpenCV threads per worker (default: cores / workers)")
+    parser.add_argument("--chunk-seconds", type=float, default=30.0)
+    parser.add_argument("--stride", type=int, default=1, help="run the detector on every n-th frame")
+    parser.add_argument("--no-motion-gate", action="store_true", help="run yolo even on static frames")
+    parser.add_argument("--ffprobe", default="ffprobe")
+    args = parser.parse_args()
+
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        print("No videos found")
+        return 2
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    plans = {}
+    jobs = []
+    for path in inputs:
+        info, chunks = plan_chunks(path, args.chunk_seconds, args.ffprobe)
+        plans[path] = info
+        jobs.extend(
+            (path, first, last, info["fps"], args.classes, args.stride, not args.no_motion_gate)
+            for first, last in chunks
+        )
+    print("{} videos, {} chunks, {} workers x {} threads".format(len(inputs), len(jobs), args.workers, threads))
+
+    start = time.perf_counter()
+    results = {path: [] for path in inputs}
+    # longest chunks first keeps the workers busy until the end
+    jobs.sort(key=lambda job: job[2] - job[1], reverse=True)
+    with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(threads,)) as pool:
+        for done, result in enumerate(pool.imap_unordered(process_chunk, jobs), 1):
+            results[result["path"]].append(result)
+            print("{}/{} {} frames {}-{} in {:.1f}s".format(
+                done, len(jobs), result["path"], result["first"], result["last"], result["seconds"]))
+    wall = time.perf_counter() - start
+
+    videos = [build_index(plans[path], results[path], args.stride) for path in inputs]
+    frames = sum(v["frames"] for v in videos)
+    footage = sum(v["frames"] / v["fps"] for v in videos)
+    index = {
+        "created": time.time(),
+        "classes": args.classes,
+        "stride": args.stride,
+        "videos": videos,
+        "summary": {"videos": len(videos), "frames": frames, "footage_seconds": footage, "wall_seconds": wall},
+    }
+    with open(args.output, "w") as f:
+        json.dump(index, f)
+    print("{} frames ({:.0f}s of footage) in {:.0f}s, {:.1f}x real time, index in {}".format(
+        frames, footage, wall, footage / wall if wall else 0.0, args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+# Microbenchmarks for the vision pipeline, runs without the drone.
+#
+#   python benchmark_pipeline.py                      # run and print the report
+#   python benchmark_pipeline.py --save-baseline      # store the results as baseline
+#   python benchmark_pipeline.py --compare            # flag stages slower than the baseline
+#   python benchmark_pipeline.py --video flight.avi   # use a recorded sequence for tracking/haar
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy
+
+from ImageProcessing.yolov3 import Yolo
+from ImageProcessing.display import BGRADisplay
+from ImageProcessing.face_detector import FaceDetector
+from ImageProcessing.trackers import TRACKERS, ScaledTracker, create_tracker
+
+BASELINE_FILE = "benchmark_baseline.json"
+IMAGE_FILE = "./ImageProcessing/bird.jpg"
+FRAME_SIZE = (960, 720)  # Tello frame size (width, height)
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Returns timing statistics in milliseconds"""
+    ms = [s * 1000 for s in samples]
+    return {
+        "n": len(ms),
+        "mean": sum(ms) / len(ms),
+        "p50": percentile(ms, 50),
+        "p90": percentile(ms, 90),
+        "p99": percentile(ms, 99),
+        "max": max(ms),
+    }
+
+
+def time_stage(fn, inputs, repeat, warmup=2):
+    """Times fn over inputs (cycled), returns the list of durations in seconds"""
+    for i in range(warmup):
+        fn(inputs[i % len(inputs)])
+    samples = []
+    for i in range(repeat):
+        arg = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def synthetic_sequence(image, count, step=4):
+    """Frames of image panning horizontally, as seen while the drone yaws"""
+    image = cv2.resize(image, FRAME_SIZE)
+    frames = []
+    for i in range(count):
+        shift = numpy.float32([[1, 0, i * step], [0, 1, 0]])
+        frames.append(cv2.warpAffine(image, shift, FRAME_SIZE, borderMode=cv2.BORDER_REFLECT))
+    return frames
+
+
+def recorded_sequence(path, count):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        grabbed, frame = cap.read()
+        if not grabbed:
+            break
+        frames.append(cv2.resize(frame, FRAME_SIZE))
+    cap.release()
+    if not frames:
+        raise IOError("No frames could be read from {}".format(path))
+    return frames
+
+
+def bench_yolo(image, repeat):
+    yolo = Yolo()
+    try:
+        yolo.initializeModel()
+    except cv2.error as e:
+        print("Skipping yolo stages, model could not be loaded: {}".format(e))
+        return {}
+    frame = cv2.resize(image, FRAME_SIZE)
+    blob = yolo.preprocess(frame)
+    outs = yolo.forward(blob)
+    return {
+        "yolo.preprocess": time_stage(yolo.preprocess, [frame], repeat),
+        "yolo.forward": time_stage(yolo.forward, [blob], max(1, repeat // 5)),
+        "yolo.postprocess": time_stage(
+            lambda o: yolo.postprocess(o, FRAME_SIZE[0], FRAME_SIZE[1]), [outs], repeat
+        ),
+    }
+
+
+def bench_tracker(name, frames, bbox, scale):
+    # the backend as the autopilot runs it: library wrapper (confidence included) on the scaled frame
+    tracker = ScaledTracker(create_tracker(name), scale=scale)
+    tracker.init(frames[0], bbox)
+    return {"tracker.{}.update".format(name): time_stage(tracker.update, frames[1:], len(frames) - 1, warmup=0)}
+
+
+def bench_haar(frames, repeat):
+    cascade = cv2.CascadeClassifier("haarcascade_frontalface_default.xml")
+
+    def detect(frame):
+        gray_img = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cascade.detectMultiScale(gray_img, 1.3, 5)
+
+    return {"haar.detectMultiScale": time_stage(detect, frames, repeat)}
+
+
+def bench_face_detector(frames, repeat, scale):
+    # configured like Game.initializeFaceFinder, without a face in view every call is a full scan
+    detector = FaceDetector(roi_scale=scale, full_scales=(scale,))
+    return {"face_detector.detect": time_stage(detector.detect, frames, repeat)}
+
+
+def bench_display(frames, repeat):
+    # window surfaces are stored row by row, sdl2.ext.pixels3d returns them indexed [x][y]
+    surface = numpy.zeros((FRAME_SIZE[1], FRAME_SIZE[0], 4), dtype=numpy.uint8)
+    window_array = surface.transpose(1, 0, 2)
+    display = BGRADisplay(window_array)
+
+    # the conversion Game.run used before the display adapter, kept for comparison
+    def convert(frame):
+        image = cv2.flip(frame, 1)
+        image = numpy.insert(image, 3, 255, axis=2)
+        image = numpy.rot90(image)
+        numpy.copyto(window_array, image)
+
+    return {
+        "display.convert": time_stage(convert, frames, repeat),
+        "display.adapter": time_stage(display.show, frames, repeat),
+    }
+
+
+def run(args):
+    image = cv2.imread(IMAGE_FILE)
+    if image is None:
+        raise IOError("Could not read {}".format(IMAGE_FILE))
+    if args.video:
+        frames = recorded_sequence(args.video, args.frames)
+    else:
+        frames = synthetic_sequence(image, args.frames)
+    h, w = frames[0].shape[:2]
+    bbox = (w // 3, h // 4, w // 4, h // 2)
+
+    results = {}
+    if not args.skip_yolo:
+        results.update(bench_yolo(image, args.repeat))
+    for name in args.trackers:
+        results.update(bench_tracker(name, frames, bbox, args.tracker_scale))
+    results.update(bench_haar(frames, args.repeat))
+    results.update(bench_face_detector(frames, args.repeat, args.face_scale))
+    results.update(bench_display(frames, args.repeat))
+    return {stage: summarize(samples) for stage, samples in results.items()}
+
+
+def print_report(report, baseline=None, tolerance=0.0):
+    header = "{:<28}{:>6}{:>10}{:>10}{:>10}{:>10}".format("stage", "n", "mean", "p50", "p90", "p99")
+    print(header)
+    print("-" * len(header))
+    regressions = []
+    for stage, s in sorted(report.items()):
+        line = "{:<28}{:>6}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}".format(
+            stage, s["n"], s["mean"], s["p50"], s["p90"], s["p99"]
+        )
+        if baseline is not None and stage in baseline:
+            ratio = s["p50"] / baseline[stage]["p50"] if baseline[stage]["p50"] else 1.0
+            line += "  {:+.0%}".format(ratio - 1)
+            if ratio > 1 + tolerance:
+                line += "  REGRESSION"
+                regressions.append(stage)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vision pipeline microbenchmarks (times in ms)")
+    parser.add_argument("--video", help="recorded video used for the tracking and haar stages")
+    parser.add_argument("--frames", type=int, default=60, help="length of the frame sequence")
+    parser.add_argument("--repeat", type=int, default=50, help="samples per stage")
+    parser.add_argument("--trackers", nargs="*", default=list(TRACKERS), choices=list(TRACKERS))
+    parser.add_argument("--tracker-scale", type=float, default=0.5, help="frame scale fed to the trackers")
+    parser.add_argument("--face-scale", type=float, default=0.5, help="frame scale of the face detector")
+    parser.add_argument("--skip-yolo", action="store_true")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="compare p50 against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    report = run(args)
+    baseline = None
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print("No baseline at {}, run with --save-baseline first".format(args.baseline))
+            return 2
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = print_report(report, baseline, args.tolerance)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print("Baseline saved to {}".format(args.baseline))
+    if regressions:
+        print("Regressions: {}".format(", ".join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import threading
+import time
+
+from djitellopy.metrics import metrics
+from djitellopy.tello import setup_logger
+
+controller_log = setup_logger("followController", "follow_controller.log")
+
+
+def clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+class PID:
+    """
+    PID controller on real time steps with integral anti-windup, an error
+    deadband and output slew rate limiting.
+    """
+
+    def __init__(self, kp, ki=0.0, kd=0.0, output_limit=100, integral_limit=None, deadband=0.0, slew_rate=None):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_limit = output_limit
+        self.integral_limit = integral_limit  # bound of the integral term contribution
+        self.deadband = deadband  # errors smaller than this are treated as zero
+        self.slew_rate = slew_rate  # max output change per second
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.last_error = None
+        self.last_time = None
+        self.output = 0.0
+
+    def step(self, error, now):
+        dt = now - self.last_time if self.last_time is not None else 0.0
+        if abs(error) < self.deadband:
+            error = 0.0
+        derivative = 0.0
+        if dt > 0 and self.last_error is not None:
+            derivative = (error - self.last_error) / dt
+        integral = self.integral + error * dt
+        if self.integral_limit is not None and self.ki:
+            bound = self.integral_limit / self.ki
+            integral = clamp(integral, -bound, bound)
+        raw = self.kp * error + self.ki * integral + self.kd * derivative
+        output = clamp(raw, -self.output_limit, self.output_limit)
+        # anti-windup: stop integrating while saturated unless the error drives back
+        if output == raw or error * raw < 0:
+            self.integral = integral
+        if self.slew_rate is not None and self.last_time is not None:
+            max_step = self.slew_rate * dt
+            output = clamp(output, self.output - max_step, self.output + max_step)
+        self.last_error = error
+        self.last_time = now
+        self.output = output
+        return output
+
+
+class FollowController:
+    """
+    Steers the drone towards a target at a fixed rate, independent of how fast
+    frames are processed or displayed. The target is an estimate object with
+    bbox_at(t) and can_coast(t) (e.g. a copy of a BoxKalmanFilter), evaluated at
+    the time the command is expected to reach the drone. Axes:
+        yaw - horizontal offset of the box center
+        up_down - vertical offset of the box center
+        for_back - box area compared to desired_area
+    Velocities are written to the drone object and sent with drone.update().
+    """
+
+    AXES = ("yaw", "up_down", "for_back")
+
+    def __init__(self, drone, rate=20, command_latency=0.15, desired_area=10000, log_interval=1.0, clock=time.time):
+        self.drone = drone
+        self.clock = clock  # time base of the target estimate
+        self.period = 1.0 / rate
+        self.command_latency = command_latency
+        self.desired_area = desired_area
+        self.log_interval = log_interval
+        speed = drone.S
+        self.pids = {
+            "yaw": PID(kp=speed, ki=0.2 * speed, kd=0.05 * speed, output_limit=speed,
+                       integral_limit=0.3 * speed, deadband=0.05, slew_rate=4 * speed),
+            "up_down": PID(kp=speed, ki=0.1 * speed, output_limit=speed,
+                           integral_limit=0.3 * speed, deadband=0.1, slew_rate=3 * speed),
+            "for_back": PID(kp=speed, ki=0.1 * speed, output_limit=speed,
+                            integral_limit=0.3 * speed, deadband=0.1, slew_rate=2 * speed),
+        }
+        self.lock = threading.Lock()
+        self.estimate = None
+        self.adj_axis = (0, 0, 0)
+        self.frame_size = (960, 720)
+        self.outputs = {axis: 0 for axis in self.AXES}
+        self.errors = {axis: 0.0 for axis in self.AXES}
+        self.stopped = True
+        self.reset_stats()
+
+    @property
+    def active(self):
+        return self.estimate is not None
+
+    def set_target(self, estimate, adj_axis, frame_size):
+        """estimate is read from the controller thread, pass a private copy"""
+        with self.lock:
+            if self.estimate is None or tuple(adj_axis) != self.adj_axis:
+                for pid in self.pids.values():
+                    pid.reset()
+            self.estimate = estimate
+            self.adj_axis = tuple(adj_axis)
+            self.frame_size = frame_size
+            self.drone.send_rc_control = True
+
+    def clear_target(self):
+        with self.lock:
+            if self.estimate is None:
+                return
+            self.estimate = None
+            self.write({axis: 0 for axis in self.AXES})
+
+    def errors_for(self, bbox):
+        half_w, half_h = self.frame_size[0] / 2, self.frame_size[1] / 2
+        center_x = bbox[0] + bbox[2] / 2
+        center_y = bbox[1] + bbox[3] / 2
+        area = bbox[2] * bbox[3]
+        return {
+            "yaw": (center_x - half_w) / half_w,
+            # target above the center means climb
+            "up_down": (half_h - center_y) / half_h,
+            "for_back": (self.desired_area - area) / max(self.desired_area, area, 1),
+        }
+
+    def write(self, outputs):
+        # only the followed axes are touched, the others stay under manual control
+        for axis, enabled in zip(self.AXES, self.adj_axis):
+            if enabled:
+                self.outputs[axis] = int(outputs[axis])
+                setattr(self.drone, axis + "_velocity", self.outputs[axis])
+
+    def step(self, now=None):
+        """One control update, returns the commanded outputs or None without a target"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.estimate is None:
+                return None
+            start = time.perf_counter()
+            arrival = self.clock() + self.command_latency
+            if not self.estimate.can_coast(arrival):
+                self.estimate = None
+                self.write({axis: 0 for axis in self.AXES})
+                return None
+            self.errors = self.errors_for(self.estimate.bbox_at(arrival))
+            outputs = {axis: self.pids[axis].step(self.errors[axis], now) for axis in self.AXES}
+            self.write(outputs)
+            metrics.observe("control", time.perf_counter() - start)
+        self.drone.update()
+        return dict(self.outputs)
+
+    def start(self):
+        self.stopped = False
+        threading.Thread(target=self.run, args=(), name="follow-controller", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        next_time = time.monotonic()
+        while not self.stopped:
+            now = time.monotonic()
+            self.step(now)
+            self.record(now)
+            next_time += self.period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # overran, don't try to catch up with a burst of steps
+                next_time = time.monotonic()
+
+    def reset_stats(self):
+        self.stats_start = time.monotonic()
+        self.steps = 0
+        self.last_step = None
+        self.max_interval = 0.0
+        self.abs_errors = {axis: 0.0 for axis in self.AXES}
+
+    def record(self, now):
+        if self.last_step is not None:
+            self.max_interval = max(self.max_interval, now - self.last_step)
+        self.last_step = now
+        self.steps += 1
+        if self.active:
+            for axis in self.AXES:
+                self.abs_errors[axis] += abs(self.errors[axis])
+        elapsed = now - self.stats_start
+        if elapsed >= self.log_interval:
+            controller_log.info(
+                "rate : {:.1f}Hz\tmax interval : {:.3f}s\tactive : {}\tmean abs error : {}\toutputs : {}".format(
+                    self.steps / elapsed,
+                    self.max_interval,
+                    self.active,
+                    {axis: round(e / self.steps, 3) for axis, e in self.abs_errors.items()},
+                    self.outputs,
+                )
+            )
+            self.reset_stats()
@@ -0,0 +1,104 @@
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# control block: newest sequence number, closed flag, slot count, frame shape
+CONTROL_FIELDS = 6
+
+
+class FrameBus:
+    """
+    Ring of frame slots in shared memory, written by one process and read by any
+    number of others without copying through a pipe. The n-th frame written gets
+    sequence number n (from 1) and goes to slot n % slots. A slot's sequence
+    number is -1 while the slot is being written; readers copy the frame and
+    compare the sequence number before and after, a frame overwritten meanwhile
+    is reported as gone (None) instead of returned torn.
+    Layout: int64 control block, int64 sequence and float64 time per slot,
+    int32 (height, width, channels) per slot, then the pixel data of each slot.
+    Create the bus with FrameBus(slots=..., shape=...) and attach to it in other
+    processes with FrameBus(name).
+    """
+
+    def __init__(self, name=None, slots=16, shape=(720, 960, 3)):
+        self.owner = name is None
+        if self.owner:
+            frame_bytes = int(np.prod(shape))
+            size = 8 * CONTROL_FIELDS + slots * (8 + 8 + 3 * 4 + frame_bytes)
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self.control = np.ndarray((CONTROL_FIELDS,), dtype=np.int64, buffer=self.memory.buf)
+        if self.owner:
+            self.control[:] = (0, 0, slots) + tuple(shape)
+        self.slots = int(self.control[2])
+        self.shape = tuple(int(v) for v in self.control[3:6])
+        self.frame_bytes = int(np.prod(self.shape))
+        offset = 8 * CONTROL_FIELDS
+        self.seqs = np.ndarray((self.slots,), dtype=np.int64, buffer=self.memory.buf, offset=offset)
+        offset += 8 * self.slots
+        self.times = np.ndarray((self.slots,), dtype=np.float64, buffer=self.memory.buf, offset=offset)
+        offset += 8 * self.slots
+        self.shapes = np.ndarray((self.slots, 3), dtype=np.int32, buffer=self.memory.buf, offset=offset)
+        offset += 3 * 4 * self.slots
+        self.data = np.ndarray((self.slots, self.frame_bytes), dtype=np.uint8, buffer=self.memory.buf, offset=offset)
+
+    @property
+    def latest(self):
+        """Sequence number of the newest complete frame, 0 before the first"""
+        return int(self.control[0])
+
+    @property
+    def closed(self):
+        return bool(self.control[1])
+
+    def close_stream(self):
+        """Tells the readers that no more frames will come"""
+        self.control[1] = 1
+
+    def write(self, frame, t):
+        """Publishes frame (uint8, at most the bus shape) taken at time t, returns its sequence number"""
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self.frame_bytes:
+            raise ValueError("Frame of {} bytes does not fit the {} byte slots".format(frame.nbytes, self.frame_bytes))
+        seq = self.latest + 1
+        slot = seq % self.slots
+        self.seqs[slot] = -1
+        self.data[slot, : frame.nbytes] = frame.reshape(-1)
+        self.times[slot] = t
+        self.shapes[slot] = frame.shape if frame.ndim == 3 else frame.shape + (1,)
+        self.seqs[slot] = seq
+        self.control[0] = seq
+        return seq
+
+    def read(self, seq):
+        """(frame copy, time) of frame seq, None if it was not written yet or already overwritten"""
+        if seq <= 0:
+            return None
+        slot = seq % self.slots
+        if self.seqs[slot] != seq:
+            return None
+        height, width, channels = (int(v) for v in self.shapes[slot])
+        t = float(self.times[slot])
+        frame = self.data[slot, : height * width * channels].reshape(height, width, channels).copy()
+        if self.seqs[slot] != seq:
+            return None
+        return (frame if channels > 1 else frame[:, :, 0]), t
+
+    def wait(self, after=0, timeout=None, interval=0.001):
+        """Waits for a frame newer than after, returns its sequence number or None on timeout or close"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self.latest <= after:
+            if self.closed or (deadline is not None and time.time() > deadline):
+                return None
+            time.sleep(interval)
+        return self.latest
+
+    def close(self):
+        # the numpy views must go before the mapping can be closed
+        self.control = self.seqs = self.times = self.shapes = self.data = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# tello.py records into this module, so it can't import setup_logger from there
+metrics_log = logging.getLogger("metrics")
+metrics_log.setLevel(logging.INFO)
+# delay: importing the module must not create metrics.log, only logging does
+_handler = logging.FileHandler("metrics.log", delay=True)
+_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+metrics_log.addHandler(_handler)
+
+# histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def percentile(ordered, p):
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Histogram:
+    """
+    Durations of one stage. Bucket counts, sum and count are cumulative (as
+    Prometheus expects), the last window samples are kept for percentiles.
+    """
+
+    def __init__(self, buckets=BUCKETS, window=500):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += seconds
+        self.count += 1
+        self.samples.append(seconds)
+
+    def summary(self):
+        """Statistics of the rolling window in milliseconds"""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return None
+        return {
+            "n": len(ordered),
+            "mean": 1000 * sum(ordered) / len(ordered),
+            "p50": 1000 * percentile(ordered, 50),
+            "p90": 1000 * percentile(ordered, 90),
+            "p99": 1000 * percentile(ordered, 99),
+            "max": 1000 * ordered[-1],
+        }
+
+
+class Timer:
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics:
+    """
+    Per-stage latency histograms and event counters. Disabled by default, then
+    timer() hands out a shared no-op context and observe()/count() return
+    immediately, so instrumented code costs a method call.
+        with metrics.timer("detection"):
+            ...
+        metrics.count("command_timeouts")
+    """
+
+    def __init__(self, window=500, log_interval=10.0):
+        self.window = window
+        self.log_interval = log_interval  # seconds between summary log lines
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.last_log = time.monotonic()
+        self.httpd = None
+
+    def enable(self, log_interval=None):
+        if log_interval is not None:
+            self.log_interval = log_interval
+        self.last_log = time.monotonic()
+        self.enabled = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+
+    def timer(self, stage):
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(window=self.window)
+            histogram.observe(seconds)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        with self.lock:
+            stages = {stage: h.summary() for stage, h in self.histograms.items()}
+            counters = dict(self.counters)
+        return {stage: s for stage, s in stages.items() if s is not None}, counters
+
+    def maybe_log(self, now=None):
+        """Writes a summary to metrics.log every log_interval seconds, call it from a loop"""
+        if not self.enabled:
+            return
+        now = time.monotonic() if now is None else now
+        if now - self.last_log < self.log_interval:
+            return
+        self.last_log = now
+        stages, counters = self.summary()
+        for stage, s in sorted(stages.items()):
+            metrics_log.info(
+                "{:<12} n {:4d}  mean {:7.2f}ms  p50 {:7.2f}ms  p90 {:7.2f}ms  p99 {:7.2f}ms  max {:7.2f}ms".format(
+                    stage, s["n"], s["mean"], s["p50"], s["p90"], s["p99"], s["max"]
+                )
+            )
+        if counters:
+            metrics_log.info("counters : {}".format(counters))
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = [
+            "# HELP tello_stage_seconds Duration of a pipeline stage",
+            "# TYPE tello_stage_seconds histogram",
+        ]
+        with self.lock:
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append('tello_stage_seconds_bucket{{stage="{}",le="{}"}} {}'.format(stage, bound, cumulative))
+                lines.append('tello_stage_seconds_bucket{{stage="{}",le="+Inf"}} {}'.format(stage, h.count))
+                lines.append('tello_stage_seconds_sum{{stage="{}"}} {}'.format(stage, h.total))
+                lines.append('tello_stage_seconds_count{{stage="{}"}} {}'.format(stage, h.count))
+            for name, value in sorted(self.counters.items()):
+                lines.append("# TYPE tello_{}_total counter".format(name))
+                lines.append("tello_{}_total {}".format(name, value))
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host="127.0.0.1", port=9100):
+        """Serves render() on http://host:port/metrics from a background thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, args=(), daemon=True).start()
+        metrics_log.info("Serving metrics on http://{}:{}/metrics".format(host, port))
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+# shared registry, instrumented code records into it once enabled
+metrics = Metrics()
@@ -0,0 +1,150 @@
+import time
+
+from djitellopy.tello import setup_logger
+
+mission_log = setup_logger("mission", "mission.log")
+
+# step name -> (sdk command, number of arguments)
+COMMANDS = {
+    "takeoff": ("takeoff", 0),
+    "land": ("land", 0),
+    "up": ("up", 1),
+    "down": ("down", 1),
+    "left": ("left", 1),
+    "right": ("right", 1),
+    "forward": ("forward", 1),
+    "back": ("back", 1),
+    "move_up": ("up", 1),
+    "move_down": ("down", 1),
+    "move_left": ("left", 1),
+    "move_right": ("right", 1),
+    "move_forward": ("forward", 1),
+    "move_back": ("back", 1),
+    "cw": ("cw", 1),
+    "ccw": ("ccw", 1),
+    "rotate_clockwise": ("cw", 1),
+    "rotate_counter_clockwise": ("ccw", 1),
+    "flip": ("flip", 1),
+    "go": ("go", 4),
+    "go_xyz_speed": ("go", 4),
+    "curve": ("curve", 7),
+    "curve_xyz_speed": ("curve", 7),
+    "speed": ("speed", 1),
+    "set_speed": ("speed", 1),
+}
+
+
+class StepResult:
+    def __init__(self, step, ok, response, ack_time, settle_time):
+        self.step = step
+        self.ok = ok
+        self.response = response
+        self.ack_time = ack_time  # seconds from sending to the ack
+        self.settle_time = settle_time  # seconds from the ack until the drone was steady
+
+    @property
+    def total(self):
+        return self.ack_time + self.settle_time
+
+    def __str__(self):
+        return "{:<32} {:<6} ack {:6.2f}s  settle {:5.2f}s  total {:6.2f}s".format(
+            " ".join(str(v) for v in self.step), "ok" if self.ok else "FAIL", self.ack_time, self.settle_time, self.total
+        )
+
+
+class Mission:
+    """
+    Runs a list of steps back to back instead of padding each with a fixed sleep.
+    A step is a tuple of a command name and its arguments, e.g.
+        [("takeoff",), ("move_left", 100), ("rotate_counter_clockwise", 45),
+         ("go", 50, 50, 0, 30), ("curve", 20, 20, 0, 60, 40, 0, 30), ("wait", 1.5), ("land",)]
+    A step is complete once the drone acknowledged it (the Tello answers movement commands
+    when they are done) and the state stream shows it steady: velocities and attitude
+    near zero for settle_samples packets. Per-step timing is logged and returned.
+    """
+
+    def __init__(
+        self,
+        tello,
+        steps,
+        ack_timeout=20,
+        settle_timeout=3,
+        settle_samples=3,
+        max_velocity=1,
+        max_attitude=3,
+        land_on_failure=True,
+    ):
+        self.tello = tello
+        self.steps = [tuple(step) for step in steps]
+        self.ack_timeout = ack_timeout  # seconds to wait for a step's ack
+        self.settle_timeout = settle_timeout  # seconds to wait for the drone to be steady
+        self.settle_samples = settle_samples
+        self.max_velocity = max_velocity  # vgx/vgy/vgz below this count as stopped
+        self.max_attitude = max_attitude  # pitch/roll (degrees) below this count as level
+        self.land_on_failure = land_on_failure
+        self.results = []
+        for step in self.steps:
+            self.command(step)  # fail early on unknown steps
+
+    @staticmethod
+    def command(step):
+        name, args = step[0], step[1:]
+        if name == "wait":
+            return None
+        if name not in COMMANDS:
+            raise ValueError("Unknown mission step {}".format(name))
+        command, nargs = COMMANDS[name]
+        if len(args) != nargs:
+            raise ValueError("Mission step {} takes {} arguments, got {}".format(name, nargs, len(args)))
+        return " ".join([command] + [str(arg) for arg in args])
+
+    def steady(self, state):
+        return (
+            max(abs(state.get(v, 0)) for v in ("vgx", "vgy", "vgz")) <= self.max_velocity
+            and max(abs(state.get(a, 0)) for a in ("pitch", "roll")) <= self.max_attitude
+        )
+
+    def settle(self):
+        """Waits until the state stream shows the drone steady, returns the seconds waited"""
+        start = time.time()
+        steady = 0
+        while time.time() - start < self.settle_timeout and steady < self.settle_samples:
+            state = self.tello.get_state()
+            if state is None:
+                break
+            steady = steady + 1 if self.steady(state) else 0
+        return time.time() - start
+
+    def run_step(self, step):
+        start = time.time()
+        if step[0] == "wait":
+            time.sleep(step[1])
+            return StepResult(step, True, None, time.time() - start, 0.0)
+        response = self.tello.send_command_with_ack(self.command(step), self.ack_timeout)
+        ack_time = time.time() - start
+        ok = response is not None and response.lower() == "ok"
+        settle_time = 0.0
+        if ok and step[0] != "land":
+            settle_time = self.settle()
+        return StepResult(step, ok, response, ack_time, settle_time)
+
+    def run(self):
+        """Runs all steps, stops at the first failed one. Returns the list of StepResults."""
+        self.results = []
+        mission_start = time.time()
+        for step in self.steps:
+            result = self.run_step(step)
+            self.results.append(result)
+            mission_log.info(str(result))
+            if not result.ok:
+                mission_log.error("Step {} failed: {}".format(step, result.response))
+                if self.land_on_failure and step[0] != "land":
+                    self.tello.land()
+                break
+        mission_log.info("Mission took {:.2f}s".format(time.time() - mission_start))
+        return self.results
+
+    def report(self):
+        lines = [str(result) for result in self.results]
+        lines.append("total {:.2f}s".format(sum(result.total for result in self.results)))
+        return "\n".join(lines)
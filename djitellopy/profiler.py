@@ -0,0 +1,124 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from djitellopy.tello import setup_logger
+
+profiler_log = setup_logger("profiler", "profiler.log")
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler over all Python threads (frame capture, telemetry,
+    udp receiver, controller, main loop), meant to be switched on during a
+    flight. A background thread samples the stack of every thread each
+    interval seconds, the profiled code itself is not slowed down by hooks.
+    stop() writes two files to output_dir:
+        <name>.folded - collapsed stacks "thread;outer;...;inner count", the
+                        input format of flamegraph.pl and speedscope
+        <name>.txt    - samples per thread and the functions with the most
+                        own and total samples
+    """
+
+    def __init__(self, interval=0.005, output_dir="profiles", top=30):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.top = top
+        self.thread = None
+        self.stopped = True
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None  # time.time() of the session start, None before the first one
+
+    @property
+    def running(self):
+        return not self.stopped
+
+    def toggle(self):
+        """Starts a session or stops the running one, returns the report path when stopping"""
+        if self.running:
+            return self.stop()
+        self.start()
+        return None
+
+    def start(self):
+        if self.running:
+            return self
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = time.time()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, args=(), name="sampling-profiler", daemon=True)
+        self.thread.start()
+        profiler_log.info("Profiling started, sampling every {:.1f}ms".format(1000 * self.interval))
+        return self
+
+    def stop(self):
+        """Stops sampling and writes the report, returns the path of the .txt report"""
+        if not self.running:
+            return None
+        self.stopped = True
+        self.thread.join()
+        path = self.dump()
+        profiler_log.info("Profiling stopped after {} samples, report in {}".format(self.samples, path))
+        return path
+
+    @staticmethod
+    def frame_name(frame):
+        code = frame.f_code
+        return "{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stopped:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self.frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def dump(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, "profile-" + time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started)))
+        with open(base + ".folded", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write("{} {}\n".format(";".join(stack), count))
+        with open(base + ".txt", "w") as f:
+            f.write(self.report())
+        return base + ".txt"
+
+    def report(self):
+        threads = Counter()
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            threads[stack[0]] += count
+            if len(stack) > 1:
+                own[(stack[0], stack[-1])] += count
+            # a recursive function counts once per sample
+            for name in set(stack[1:]):
+                total[(stack[0], name)] += count
+        lines = [
+            "duration {:.1f}s, {} samples every {:.1f}ms".format(
+                time.time() - self.started if self.started is not None else 0.0, self.samples, 1000 * self.interval
+            ),
+            "",
+            "samples per thread",
+        ]
+        for name, count in threads.most_common():
+            lines.append("  {:>6} {:6.1%}  {}".format(count, count / max(self.samples, 1), name))
+        for title, counter in (("own samples", own), ("total samples", total)):
+            lines.append("")
+            lines.append("top functions by {} (share of the thread's samples)".format(title))
+            for (thread, name), count in counter.most_common(self.top):
+                lines.append("  {:>6} {:6.1%}  [{}] {}".format(count, count / threads[thread], thread, name))
+        return "\n".join(lines) + "\n"
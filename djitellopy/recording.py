@@ -0,0 +1,266 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# fields of a Tello state packet, one telemetry column each
+STATE_FIELDS = (
+    "pitch", "roll", "yaw", "vgx", "vgy", "vgz", "templ", "temph",
+    "tof", "h", "bat", "baro", "time", "agx", "agy", "agz",
+)
+
+# column of the sample times (time.time()), named apart from the drone's own "time" field
+TIME_COLUMN = "_t"
+
+# one record per frame / command, the payload is at offset in the matching blob file
+INDEX_DTYPE = np.dtype([("time", "<f8"), ("id", "<i8"), ("offset", "<i8"), ("size", "<i4")])
+
+VERSION = 2
+
+
+class BlobWriter:
+    """Variable size records: payloads appended to <name>.bin, an INDEX_DTYPE record each in <name>.idx"""
+
+    def __init__(self, directory, name):
+        self.data = open(os.path.join(directory, name + ".bin"), "ab")
+        self.index = open(os.path.join(directory, name + ".idx"), "ab")
+        self.offset = self.data.tell()
+
+    def append(self, t, record_id, payload):
+        self.data.write(payload)
+        record = np.array([(t, record_id, self.offset, len(payload))], dtype=INDEX_DTYPE)
+        self.index.write(record.tobytes())
+        self.offset += len(payload)
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+class FlightRecorder:
+    """
+    Writes a flight recording: a directory holding
+        meta.json                  format version and telemetry fields
+        telemetry/<field>.f8       one little endian float64 column per state field, plus _t.f8 with the sample times
+        frames.bin / frames.idx    JPEG frames and their (time, frame_id, offset, size) index
+        commands.bin / commands.idx  every command sent, utf-8, with the same index layout
+    All times are time.time() seconds and never decrease within a stream (samples
+    racing from different threads are clamped), so they can be binary searched.
+    Files are only appended to, a recording cut short by a crash stays readable
+    up to the last complete record. Frames are encoded on a worker thread; when
+    it falls behind frames are dropped (and counted) rather than blocking the
+    video thread.
+    """
+
+    def __init__(self, directory, jpeg_quality=80, max_queue=30, flush_interval=1.0):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "telemetry"), exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            with open(meta_path, "w") as f:
+                json.dump({"version": VERSION, "fields": list(STATE_FIELDS), "created": time.time()}, f)
+        self.columns = {
+            field: open(os.path.join(directory, "telemetry", field + ".f8"), "ab")
+            for field in (TIME_COLUMN,) + STATE_FIELDS
+        }
+        self.frames = BlobWriter(directory, "frames")
+        self.commands = BlobWriter(directory, "commands")
+        self.jpeg_quality = jpeg_quality
+        self.flush_interval = flush_interval
+        self.last_flush = time.time()
+        self.last_times = {"telemetry": 0.0, "frames": 0.0, "commands": 0.0}
+        self.lock = threading.Lock()
+        self.frame_queue = queue.Queue(maxsize=max_queue)
+        self.dropped_frames = 0
+        self.command_count = 0
+        self.stopped = False
+        self.thread = threading.Thread(target=self.encode_frames, args=(), name="flight-recorder", daemon=True)
+        self.thread.start()
+
+    def record_state(self, state, t):
+        """state is a parsed state packet (dict of floats), missing fields are stored as nan"""
+        with self.lock:
+            t = self.monotonic("telemetry", t)
+            self.columns[TIME_COLUMN].write(np.float64(t).tobytes())
+            for field in STATE_FIELDS:
+                self.columns[field].write(np.float64(state.get(field, np.nan)).tobytes())
+            self.maybe_flush(t)
+
+    def record_command(self, command, t):
+        with self.lock:
+            t = self.monotonic("commands", t)
+            self.commands.append(t, self.command_count, command.encode("utf-8"))
+            self.command_count += 1
+            self.maybe_flush(t)
+
+    def record_frame(self, frame_id, frame, t):
+        """Queues the frame for encoding, the frame must not be modified afterwards"""
+        if frame is None or self.stopped:
+            return
+        try:
+            self.frame_queue.put_nowait((frame_id, frame, t))
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def encode_frames(self):
+        while True:
+            item = self.frame_queue.get()
+            if item is None:
+                return
+            frame_id, frame, t = item
+            ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                self.dropped_frames += 1
+                continue
+            with self.lock:
+                t = self.monotonic("frames", t)
+                self.frames.append(t, frame_id, data.tobytes())
+                self.maybe_flush(t)
+
+    def monotonic(self, stream, t):
+        t = max(t, self.last_times[stream])
+        self.last_times[stream] = t
+        return t
+
+    def maybe_flush(self, t):
+        if t - self.last_flush >= self.flush_interval:
+            self.flush()
+            self.last_flush = t
+
+    def flush(self):
+        for column in self.columns.values():
+            column.flush()
+        self.frames.flush()
+        self.commands.flush()
+
+    def close(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.frame_queue.put(None)
+        self.thread.join()
+        with self.lock:
+            for column in self.columns.values():
+                column.close()
+            self.frames.close()
+            self.commands.close()
+
+
+def _map(path, dtype):
+    """Memory-maps the complete records of path, an empty array for a missing or empty file"""
+    dtype = np.dtype(dtype)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=dtype)
+    count = os.path.getsize(path) // dtype.itemsize
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+class FlightRecording:
+    """
+    Reads a FlightRecorder directory. Telemetry columns, the frame index and the
+    command index are memory-mapped, nothing is parsed up front. Every lookup by
+    time is a binary search on the sorted time column, O(log n).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != VERSION:
+            raise ValueError("Unsupported recording version {}".format(self.meta.get("version")))
+        self.fields = tuple(self.meta["fields"])
+        columns = {
+            field: _map(os.path.join(directory, "telemetry", field + ".f8"), "<f8")
+            for field in (TIME_COLUMN,) + self.fields
+        }
+        # columns are written one after another, only rows complete in every column count
+        rows = min(len(column) for column in columns.values())
+        self.times = columns.pop(TIME_COLUMN)[:rows]
+        self.telemetry = {field: column[:rows] for field, column in columns.items()}
+        self.frame_index = _map(os.path.join(directory, "frames.idx"), INDEX_DTYPE)
+        self.command_index = _map(os.path.join(directory, "commands.idx"), INDEX_DTYPE)
+        self.frame_data = _map(os.path.join(directory, "frames.bin"), np.uint8)
+        self.command_data = _map(os.path.join(directory, "commands.bin"), np.uint8)
+
+    @property
+    def start(self):
+        times = [a[0] for a in (self.times, self.frame_index["time"], self.command_index["time"]) if len(a)]
+        return min(times) if times else None
+
+    @property
+    def end(self):
+        times = [a[-1] for a in (self.times, self.frame_index["time"], self.command_index["time"]) if len(a)]
+        return max(times) if times else None
+
+    def column(self, field):
+        """Memory-mapped telemetry column, aligned with the sample times in times"""
+        return self.telemetry[field]
+
+    @staticmethod
+    def index_at(times, t):
+        """Position of the last entry at or before t, -1 before the first"""
+        return int(np.searchsorted(times, t, side="right")) - 1
+
+    def state_at(self, t):
+        """Latest state sample at or before t as a dict, empty before the first sample"""
+        i = self.index_at(self.times, t)
+        if i < 0:
+            return {}
+        return {field: float(self.telemetry[field][i]) for field in self.fields if not np.isnan(self.telemetry[field][i])}
+
+    def yaw_at(self, t):
+        """Yaw interpolated between the samples around t, None without samples"""
+        times, yaws = self.times, self.telemetry["yaw"]
+        if len(times) == 0:
+            return None
+        i = self.index_at(times, t)
+        if i < 0:
+            return float(yaws[0])
+        if i + 1 >= len(times) or times[i + 1] == times[i]:
+            return float(yaws[i])
+        # shortest way around the +-180 degree wrap
+        delta = (yaws[i + 1] - yaws[i] + 180) % 360 - 180
+        return float(yaws[i] + delta * (t - times[i]) / (times[i + 1] - times[i]))
+
+    def frame_count(self):
+        return len(self.frame_index)
+
+    def frame(self, i):
+        """(frame_id, image, time) of the i-th recorded frame"""
+        record = self.frame_index[i]
+        data = self.frame_data[record["offset"] : record["offset"] + record["size"]]
+        return int(record["id"]), cv2.imdecode(np.asarray(data), cv2.IMREAD_COLOR), float(record["time"])
+
+    def frame_at(self, t):
+        """The frame shown at time t, None before the first frame"""
+        i = self.index_at(self.frame_index["time"], t)
+        return self.frame(i) if i >= 0 else None
+
+    def frames(self, start=None, end=None):
+        """Iterates (frame_id, image, time) from start to end"""
+        times = self.frame_index["time"]
+        first = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        last = len(times) if end is None else int(np.searchsorted(times, end, side="right"))
+        for i in range(first, last):
+            yield self.frame(i)
+
+    def commands(self, start=None, end=None):
+        """List of (time, command) sent between start and end"""
+        times = self.command_index["time"]
+        first = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        last = len(times) if end is None else int(np.searchsorted(times, end, side="right"))
+        result = []
+        for record in self.command_index[first:last]:
+            data = self.command_data[record["offset"] : record["offset"] + record["size"]]
+            result.append((float(record["time"]), bytes(data).decode("utf-8")))
+        return result
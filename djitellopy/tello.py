@@ -3,8 +3,10 @@ import socket
 import time
 import threading
 import cv2
+from collections import deque
 from threading import Thread
 from djitellopy.decorators import accepts
+from djitellopy.metrics import metrics
 
 import logging
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -13,7 +15,8 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 def setup_logger(name, log_file, level=logging.INFO):
     """Function setup as many loggers as you want"""
 
-    handler = logging.FileHandler(log_file)        
+    # the file is only created once something is logged
+    handler = logging.FileHandler(log_file, delay=True)
     handler.setFormatter(formatter)
 
     logger = logging.getLogger(name)
@@ -35,9 +38,10 @@ class Tello:
     # Send and receive commands, client socket
     UDP_IP = '192.168.10.1'
     UDP_PORT = 8889
+    CLIENT_UDP_PORT = 8889  # local port the responses arrive on
     RESPONSE_TIMEOUT = 0.3  # in seconds
     TIME_BTW_COMMANDS = 0.3  # in seconds
-    TIME_BTW_RC_CONTROL_COMMANDS = 0.3  # in seconds
+    TIME_BTW_RC_CONTROL_COMMANDS = 0.02  # in seconds, the follow controller sends at 20Hz
     last_received_command = time.time()
 
     # Video stream, server socket
@@ -58,17 +62,20 @@ class Tello:
     tello_status_read=None
     status=None
 
+    # FlightRecorder storing frames, state packets and commands, see start_recording
+    recorder = None
+
     def __init__(self):
         # To send comments
         self.address = (self.UDP_IP, self.UDP_PORT)
         self.clientSocket = socket.socket(socket.AF_INET,  # Internet
                                           socket.SOCK_DGRAM)  # UDP
-        self.clientSocket.bind(('', self.UDP_PORT))  # For UDP response (receiving data)
+        self.clientSocket.bind(('', self.CLIENT_UDP_PORT))  # For UDP response (receiving data)
         self.response = None
         self.stream_on = False
 
         # Run tello udp receiver on background
-        thread = threading.Thread(target=self.run_udp_receiver, args=())
+        thread = threading.Thread(target=self.run_udp_receiver, args=(), name='udp-receiver')
         thread.daemon = True
         thread.start()
 
@@ -121,7 +128,16 @@ class Tello:
         return self.tello_status_read.get_status()
 
     def get_height_status(self):
+        # the state thread already parsed the latest packet, no need to parse the string again
+        if self.tello_status_read is not None and "h" in self.tello_status_read.state:
+            return int(self.tello_status_read.state["h"])
         return int(self.get_tello_status().h)
+
+    def get_yaw_at(self, timestamp):
+        """Yaw (degrees) reported by the state stream at timestamp (time.time() based), None if unknown"""
+        if self.tello_status_read is None:
+            self.tello_status_read = TelloStatusRead(self, self.get_udp_state_address()).start()
+        return self.tello_status_read.yaw_at(timestamp)
     
     def stop_video_capture(self):
         return self.streamoff()
@@ -141,10 +157,13 @@ class Tello:
         timestamp = int(time.time() * 1000)
 
         self.clientSocket.sendto(command.encode('utf-8'), self.address)
+        if self.recorder is not None:
+            self.recorder.record_command(command, time.time())
 
         while self.response is None:
             if (time.time() * 1000) - timestamp > self.RESPONSE_TIMEOUT * 1000:
                 print('Timeout exceed on command ' + command)
+                metrics.count('command_timeouts')
                 return False
 
         logger.info('Response: ' + str(self.response))
@@ -157,6 +176,30 @@ class Tello:
 
         return response
 
+    def send_command_with_ack(self, command, timeout):
+        """Send a command whose response only arrives once the drone carried it out (takeoff, land, moves,
+        rotations, go, curve) and wait up to timeout seconds for it.
+        Return:
+            str: the response, None on timeout
+        """
+        self.response = None
+        logger.info('Send command (wait for ack): ' + command)
+        self.clientSocket.sendto(command.encode('utf-8'), self.address)
+        if self.recorder is not None:
+            self.recorder.record_command(command, time.time())
+        deadline = time.time() + timeout
+        while self.response is None:
+            if time.time() > deadline:
+                logger.error('Timeout exceed on command ' + command)
+                metrics.count('command_timeouts')
+                return None
+            time.sleep(0.01)
+        response = self.response.decode('utf-8').strip()
+        self.response = None
+        self.last_received_command = time.time() * 1000
+        logger.info('Response: ' + response)
+        return response
+
     @accepts(command=str)
     def send_command_without_return(self, command):
         """Send command to Tello without expecting a response. Use this method when you want to send a command
@@ -183,6 +226,8 @@ class Tello:
 
         logger.info('Send command (no expect response): ' + command)
         self.clientSocket.sendto(command.encode('utf-8'), self.address)
+        if self.recorder is not None:
+            self.recorder.record_command(command, time.time())
 
     @accepts(command=str)
     def send_control_command(self, command):
@@ -502,7 +547,7 @@ class Tello:
         return self.send_command_without_return('go %s %s %s %s' % (x, y, z, speed))
 
     @accepts(x1=int, y1=int, z1=int, x2=int, y2=int, z2=int, speed=int)
-    def go_xyz_speed(self, x1, y1, z1, x2, y2, z2, speed):
+    def curve_xyz_speed(self, x1, y1, z1, x2, y2, z2, speed):
         """Tello fly a curve defined by the current and two given coordinates with speed (cm/s).
             - If the arc radius is not within the range of 0.5-10 meters, it responses false.
             - x/y/z can’t be between -20 – 20 at the same time.
@@ -543,12 +588,14 @@ class Tello:
         Returns:
             bool: True for successful, False for unsuccessful
         """
-        if int(time.time() * 1000) - self.last_rc_control_sent < self.TIME_BTW_RC_CONTROL_COMMANDS:
-            pass
+        now = time.time()
+        if now - self.last_rc_control_sent < self.TIME_BTW_RC_CONTROL_COMMANDS:
+            metrics.count('rc_sends_dropped')
         else:
-            self.last_rc_control_sent = int(time.time() * 1000)
-            return self.send_command_without_return('rc %s %s %s %s' % (left_right_velocity, forward_backward_velocity,
-                                                                        up_down_velocity, yaw_velocity))
+            self.last_rc_control_sent = now
+            with metrics.timer('rc_send'):
+                return self.send_command_without_return('rc %s %s %s %s' % (left_right_velocity, forward_backward_velocity,
+                                                                            up_down_velocity, yaw_velocity))
 
     def set_wifi_with_ssid_password(self):
         """Set Wi-Fi with SSID password.
@@ -628,45 +675,74 @@ class Tello:
             str: snr
         """
         return self.send_read_command('wifi?')
-    def go_to_ground(self):
-        """
-        Descend to ground level
-        while
+
+    def get_state(self, timeout=1.0):
+        """Waits for the next state packet and returns its fields as a dict of floats, None on timeout.
+        The state stream arrives at about 10Hz, so this paces a control loop at telemetry rate."""
+        if self.tello_status_read is None:
+            self.tello_status_read = TelloStatusRead(self, self.get_udp_state_address()).start()
+        return self.tello_status_read.wait_state(timeout)
+
+    def get_last_state(self):
+        """Fields of the latest state packet as a dict of floats, without waiting (empty before the first packet)"""
+        if self.tello_status_read is None:
+            self.tello_status_read = TelloStatusRead(self, self.get_udp_state_address()).start()
+        return dict(self.tello_status_read.state)
+
+    def _altitude_loop(self, target, timeout):
+        """Closes the loop on the state stream: steps the AltitudeTarget with every packet and sends its
+        velocity until it is reached. Returns the last state or None."""
+        deadline = time.time() + timeout
+        state = None
+        while time.time() < deadline:
+            state = self.get_state()
+            if state is None or "h" not in state:
+                continue
+            velocity = target.step(state)
+            self.send_rc_control(0, 0, velocity, 0)
+            if target.reached:
+                return state
+        self.send_rc_control(0, 0, 0, 0)
+        logger.error("Altitude change timed out, last state: {}".format(state))
+        return None
+
+    def go_to_ground(self, ground_height=20, speed=60, timeout=12, settle_samples=2):
+        """
+        Descend to about ground_height cm above the ground, using h (height) and tof (distance sensor)
+        Returns:
+            bool: True for successful, False for unsuccessful
         """
-        tries=40
-        while self.get_height_status()>=20:
-            self.send_rc_control(0,0,-60,0)
-            time.sleep(0.3)
-            tries-=1
-            if tries==0:
-                break
-        time.sleep(2)
-        if self.get_height_status()<=10:
-            return True
-        return False
+        target = AltitudeTarget.to_ground(ground_height, speed, settle_samples)
+        return self._altitude_loop(target, timeout) is not None
 
-    def go_to_height(self,height):
+    def go_to_height(self, height, tolerance=10, max_speed=60, min_speed=15, timeout=12, settle_samples=2):
         """
-        Go to Height
-        while
+        Go to height (cm), the up/down velocity is proportional to the remaining distance
+        Returns:
+            bool: True for successful, False for unsuccessful
         """
-        tries=40
-        height_live=self.get_height_status()
-        while self.get_height_status()<=height-10 or self.get_heigth_status()>=height+10:
-            vel=(height-height_live)*60/height
-            self.send_rc_control(0,0,vel,0)
-            time.sleep(0.3)
-            tries-=1
-            if tries==0:
-                break
-        time.sleep(2)
-        if self.get_height_status()>=height-10 and self.get_heigth_status()<=height+10:
-            return True
-        return False
-    
-        
+        target = AltitudeTarget.to_height(height, tolerance, max_speed, min_speed, settle_samples)
+        return self._altitude_loop(target, timeout) is not None
+
+    def start_recording(self, directory, **kwargs):
+        """Records every frame, state packet and sent command into a FlightRecorder directory"""
+        from djitellopy.recording import FlightRecorder
+        self.stop_recording()
+        self.recorder = FlightRecorder(directory, **kwargs)
+        if self.tello_status_read is None:
+            self.tello_status_read = TelloStatusRead(self, self.get_udp_state_address()).start()
+        logger.info('Recording to ' + directory)
+        return self.recorder
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+            logger.info('Recording stopped, {} frames dropped'.format(recorder.dropped_frames))
+
     def end(self):
         """Call this method when you want to end the tello object"""
+        self.stop_recording()
         if self.stream_on:
             self.streamoff()
         if self.background_frame_read is not None:
@@ -676,6 +752,63 @@ class Tello:
         if self.cap is not None:
             self.cap.release()
 
+
+class AltitudeTarget:
+    """
+    One altitude change, closed on the state stream without blocking. step(state) returns the up/down
+    velocity to send for the latest state; reached is set once done(state) has held with the vertical
+    speed vgz ~0 for settle_samples packets in a row. A state seen again (the caller runs faster than
+    the 10Hz telemetry) does not count as another packet.
+    """
+
+    def __init__(self, done, velocity, settle_samples=2):
+        self.done = done
+        self.velocity = velocity
+        self.settle_samples = settle_samples
+        self.settled = 0
+        self.reached = False
+        self.last_state = None
+
+    @classmethod
+    def to_height(cls, height, tolerance=10, max_speed=60, min_speed=15, settle_samples=2):
+        """Up/down velocity proportional to the remaining distance to height (cm)"""
+        def done(state):
+            return abs(height - state["h"]) <= tolerance
+
+        def velocity(state):
+            error = height - state["h"]
+            vel = int(error * max_speed / max(height, 1))
+            # small commands don't move the drone at all
+            if abs(vel) < min_speed:
+                vel = min_speed if error > 0 else -min_speed
+            return max(-max_speed, min(max_speed, vel))
+
+        return cls(done, velocity, settle_samples)
+
+    @classmethod
+    def to_ground(cls, ground_height=20, speed=60, settle_samples=2):
+        """Descends at speed to about ground_height cm, using h (height) and tof (distance sensor)"""
+        def done(state):
+            tof = state.get("tof")
+            return state["h"] <= ground_height or (tof is not None and 10 < tof <= ground_height + 10)
+
+        return cls(done, lambda state: -speed, settle_samples)
+
+    def step(self, state):
+        if not state or "h" not in state:
+            return 0
+        new_packet = state != self.last_state
+        self.last_state = state
+        if self.done(state):
+            if new_packet:
+                self.settled = self.settled + 1 if abs(state.get("vgz", 0)) <= 1 else 0
+            self.reached = self.settled >= self.settle_samples
+            return 0
+        self.settled = 0
+        self.reached = False
+        return self.velocity(state)
+
+
 class TelloStatus:
     """
     Tello Status Class object
@@ -726,6 +859,7 @@ class TelloStatusRead:
         b'pitch:-2;roll:1;yaw:81;vgx:0;vgy:0;vgz:0;templ:59;temph:60;tof:78;h:70;bat:36;baro:625.48;time:7;agx:-4.00;agy:0.00;agz:-980.00;\r\n'
     """
     def __init__(self,tello,address):
+        self.tello = tello
         self.address = address
         self.TelloStatusSocket = socket.socket(socket.AF_INET,  # Internet
                                           socket.SOCK_DGRAM)  # UDP
@@ -735,14 +869,69 @@ class TelloStatusRead:
         self.stopped=False
         self.logger=tello_status_log
         self.TelloStatus=TelloStatus()
+        # (receive time, yaw) of the latest state packets, used to align the yaw with video frames
+        self.yaw_history = deque(maxlen=200)
+        # fields of the latest packet, waiters are woken up on every packet
+        self.state = {}
+        self.state_time = None
+        self.state_updated = threading.Condition()
 
     def start(self):
-        Thread(target=self.update_status, args=()).start()
+        Thread(target=self.update_status, args=(), name='telemetry').start()
         return self
 
     def update_status(self):
         while not self.stopped:
-            (self.status, _) = self.TelloStatusSocket.recvfrom(1024)
+            (status, _) = self.TelloStatusSocket.recvfrom(1024)
+            timestamp = time.time()
+            state = self.parse_state(status)
+            with self.state_updated:
+                self.status = status
+                self.state = state
+                self.state_time = timestamp
+                self.state_updated.notify_all()
+            if "yaw" in state:
+                self.yaw_history.append((timestamp, state["yaw"]))
+            recorder = self.tello.recorder
+            if recorder is not None:
+                recorder.record_state(state, timestamp)
+
+    @staticmethod
+    def parse_state(status):
+        """Parses a raw state packet into a dict of floats"""
+        state = {}
+        for field in status.split(b";"):
+            key, _, value = field.partition(b":")
+            try:
+                state[key.strip().decode("utf-8")] = float(value)
+            except ValueError:
+                pass
+        return state
+
+    def wait_state(self, timeout=1.0):
+        """Blocks until the next state packet arrives, returns its fields (None on timeout)"""
+        with self.state_updated:
+            last = self.state_time
+            self.state_updated.wait_for(lambda: self.state_time != last, timeout)
+            if self.state_time == last:
+                return None
+            return self.state
+
+    def yaw_at(self, timestamp):
+        """Yaw (degrees) at timestamp, linearly interpolated between state packets"""
+        history = list(self.yaw_history)
+        if not history:
+            return None
+        if timestamp <= history[0][0]:
+            return history[0][1]
+        for (t0, yaw0), (t1, yaw1) in zip(history, history[1:]):
+            if t0 <= timestamp <= t1:
+                if t1 == t0:
+                    return yaw1
+                # shortest way around the +-180 degree wrap
+                delta = (yaw1 - yaw0 + 180) % 360 - 180
+                return yaw0 + delta * (timestamp - t0) / (t1 - t0)
+        return history[-1][1]
 
     def parse(self):
         if self.status==None:
@@ -785,6 +974,7 @@ class BackgroundFrameRead:
     """
 
     def __init__(self, tello, address):
+        self.tello = tello
         tello.cap = cv2.VideoCapture(address)
         self.cap = tello.cap
 
@@ -792,10 +982,13 @@ class BackgroundFrameRead:
             self.cap.open(address)
 
         self.grabbed, self.frame = self.cap.read()
+        # Sequence number of the current frame, increases by one per frame read
+        self.frame_id = 0
+        self.latest = (self.frame_id, self.frame, time.time())
         self.stopped = False
 
     def start(self):
-        Thread(target=self.update_frame, args=()).start()
+        Thread(target=self.update_frame, args=(), name='frame-capture').start()
         return self
 
     def update_frame(self):
@@ -803,7 +996,22 @@ class BackgroundFrameRead:
             if not self.grabbed or not self.cap.isOpened():
                 self.stop()
             else:
-                (self.grabbed, self.frame) = self.cap.read()
+                (self.grabbed, frame) = self.cap.read()
+                timestamp = time.time()
+                self.frame_id += 1
+                self.frame = frame
+                self.latest = (self.frame_id, frame, timestamp)
+                recorder = self.tello.recorder
+                if recorder is not None:
+                    recorder.record_frame(self.frame_id, frame, timestamp)
+
+    def read(self):
+        """Returns (frame_id, frame) of the latest frame. Both values always belong together."""
+        return self.latest[:2]
+
+    def read_stamped(self):
+        """Returns (frame_id, frame, timestamp) of the latest frame, timestamp is the time it was decoded."""
+        return self.latest
 
     def stop(self):
         self.stopped = True
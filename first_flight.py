@@ -1,21 +1,20 @@
 from djitellopy import Tello
-import cv2
-import time
+from djitellopy.mission import Mission
 
 tello = Tello()
 
 tello.connect()
 
-tello.takeoff()
-time.sleep(5)
-
-tello.move_left(100)
-time.sleep(5)
-
-tello.rotate_counter_clockwise(45)
-time.sleep(5)
-
-tello.land()
-time.sleep(5)
+mission = Mission(
+    tello,
+    [
+        ("takeoff",),
+        ("move_left", 100),
+        ("rotate_counter_clockwise", 45),
+        ("land",),
+    ],
+)
+mission.run()
+print(mission.report())
 
 tello.end()
@@ -5,6 +5,7 @@ import cv2
 import numpy as np
 import cv2 as cv
 from ImageProcessing.yolov3 import Yolo
+from ImageProcessing.trackers import TrackerSelector
 
 face_cascade = cv.CascadeClassifier("haarcascade_frontalface_default.xml")
 eye_cascade = cv.CascadeClassifier("haarcascade_eye.xml")
@@ -12,7 +13,7 @@ eye_cascade = cv.CascadeClassifier("haarcascade_eye.xml")
 cap = cv2.VideoCapture(0)
 yolo = Yolo()
 yolo.initializeModel()
-tracker = cv2.TrackerCSRT().create()
+tracker = TrackerSelector(initial="CSRT")
 tracker_start = False
 first_frame = True
 # size=
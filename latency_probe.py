@@ -0,0 +1,260 @@
+# Glass-to-glass latency of the autopilot, measured without the drone.
+#
+#   python latency_probe.py --target face.jpg                  # face follow, 60 seconds
+#   python latency_probe.py --target person.jpg --mode person --duration 120
+#
+# A local H.264 stream (ffmpeg) stands in for the drone camera and a fake drone
+# answers the commands on localhost. Every frame carries its sequence number as
+# a row of black/white blocks. The target image jumps between the left and the
+# right of the frame every --period seconds. The autopilot runs headless in
+# this process, the rc datagrams it sends are timestamped when they reach the
+# fake drone. Reported latencies:
+#   transport - frame handed to the encoder -> decoded by BackgroundFrameRead
+#   pipeline  - target jump decoded -> first rc command yawing the new way
+#   total     - target jump handed to the encoder -> that rc command
+import argparse
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+import numpy
+
+import tello_fast_game
+from benchmark_pipeline import summarize
+from djitellopy import Tello
+
+FRAME_SIZE = (960, 720)
+MARKER_BITS = 20
+MARKER_BLOCK = (40, 16)  # width, height of one marker bit
+FAKE_DRONE_PORT = 9889
+STATE_PACKET = (
+    "pitch:0;roll:0;yaw:0;vgx:0;vgy:0;vgz:0;templ:60;temph:62;tof:10;h:100;"
+    "bat:90;baro:100.00;time:0;agx:0.00;agy:0.00;agz:-1000.00;\r\n"
+)
+
+
+def draw_marker(frame, seq):
+    w, h = MARKER_BLOCK
+    for bit in range(MARKER_BITS):
+        value = 255 if (seq >> bit) & 1 else 0
+        frame[0:h, bit * w : (bit + 1) * w] = value
+
+
+def read_marker(frame):
+    """Sequence number drawn by draw_marker, read from the block centers"""
+    w, h = MARKER_BLOCK
+    row = frame[h // 2, w // 2 : MARKER_BITS * w : w]
+    bits = row.mean(axis=1) > 127 if row.ndim == 2 else row > 127
+    return sum(1 << i for i, bit in enumerate(bits) if bit)
+
+
+class FakeDrone:
+    """Answers commands with ok, records rc datagrams and sends state packets at 10Hz"""
+
+    def __init__(self, port=FAKE_DRONE_PORT, state_port=Tello.TS_UDP_PORT, on_streamon=None):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", port))
+        self.state_address = ("127.0.0.1", state_port)
+        self.on_streamon = on_streamon
+        self.rc = []  # (arrival time, [left_right, for_back, up_down, yaw])
+        self.stopped = False
+
+    def start(self):
+        threading.Thread(target=self.receive, args=(), name="fake-drone", daemon=True).start()
+        threading.Thread(target=self.send_state, args=(), name="fake-state", daemon=True).start()
+        return self
+
+    def receive(self):
+        while not self.stopped:
+            data, address = self.socket.recvfrom(1024)
+            arrival = time.time()
+            command = data.decode("utf-8").strip()
+            if command.startswith("rc "):
+                self.rc.append((arrival, [int(v) for v in command.split()[1:]]))
+                continue
+            self.socket.sendto(b"ok", address)
+            if command == "streamon" and self.on_streamon is not None:
+                self.on_streamon()
+
+    def send_state(self):
+        while not self.stopped:
+            self.socket.sendto(STATE_PACKET.encode(), self.state_address)
+            time.sleep(0.1)
+
+
+class MarkerSource:
+    """Renders marked frames and streams them as H.264 to the video port"""
+
+    def __init__(self, target, fps=30, period=2.0, ffmpeg="ffmpeg", port=Tello.VS_UDP_PORT):
+        self.fps = fps
+        self.period_frames = max(1, int(period * fps))
+        self.command = [
+            ffmpeg, "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", "{}x{}".format(*FRAME_SIZE), "-r", str(fps), "-i", "-",
+            "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency",
+            "-g", str(fps), "-bf", "0", "-f", "h264", "udp://127.0.0.1:{}?pkt_size=1460".format(port),
+        ]
+        # the target at the left and at the right third of a gray frame
+        self.backgrounds = []
+        th, tw = target.shape[:2]
+        for center in (FRAME_SIZE[0] // 4, 3 * FRAME_SIZE[0] // 4):
+            frame = numpy.full((FRAME_SIZE[1], FRAME_SIZE[0], 3), 96, dtype=numpy.uint8)
+            x, y = center - tw // 2, (FRAME_SIZE[1] - th) // 2
+            frame[y : y + th, x : x + tw] = target
+            self.backgrounds.append(frame)
+        self.sent = {}  # seq -> time handed to the encoder
+        self.jumps = []  # (seq, time, side) of the first frame after a jump, side 1 is right
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, args=(), name="marker-source", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        process = subprocess.Popen(self.command, stdin=subprocess.PIPE)
+        frame = numpy.empty_like(self.backgrounds[0])
+        next_time = time.time()
+        seq = 0
+        side = None
+        while not self.stopped:
+            new_side = (seq // self.period_frames) % 2
+            numpy.copyto(frame, self.backgrounds[new_side])
+            draw_marker(frame, seq)
+            sent = time.time()
+            process.stdin.write(frame.tobytes())
+            process.stdin.flush()
+            self.sent[seq] = sent
+            if new_side != side:
+                self.jumps.append((seq, sent, new_side))
+                side = new_side
+            seq += 1
+            next_time += 1.0 / self.fps
+            time.sleep(max(0.0, next_time - time.time()))
+        process.stdin.close()
+        process.wait()
+
+
+class MarkerReader:
+    """Reads the marker of every new frame of a BackgroundFrameRead"""
+
+    def __init__(self, frame_read):
+        self.frame_read = frame_read
+        self.decoded = {}  # seq -> time BackgroundFrameRead had the frame
+        self.stopped = False
+
+    def start(self):
+        threading.Thread(target=self.run, args=(), name="marker-reader", daemon=True).start()
+        return self
+
+    def run(self):
+        last_id = None
+        while not self.stopped:
+            frame_id, frame, timestamp = self.frame_read.read_stamped()
+            if frame_id != last_id and frame is not None:
+                last_id = frame_id
+                self.decoded.setdefault(read_marker(frame), timestamp)
+            time.sleep(0.001)
+
+
+def responses(jumps, rc, decoded, warmup, period):
+    """Matches each target jump with the first rc datagram yawing towards the new side"""
+    total, pipeline = [], []
+    start = jumps[0][1] + warmup if jumps else 0
+    for seq, sent, side in jumps:
+        if sent < start:
+            continue
+        previous = None
+        for arrival, velocities in rc:
+            if arrival <= sent:
+                previous = velocities[3]
+                continue
+            if arrival > sent + period:
+                break
+            yaw = velocities[3]
+            if previous is not None and (yaw > previous if side == 1 else yaw < previous):
+                total.append(arrival - sent)
+                if seq in decoded:
+                    pipeline.append(arrival - decoded[seq])
+                break
+            previous = yaw
+    return total, pipeline
+
+
+def print_report(stages, lost):
+    header = "{:<12}{:>6}{:>10}{:>10}{:>10}{:>10}{:>10}".format("latency", "n", "mean", "p50", "p90", "p99", "max")
+    print(header)
+    print("-" * len(header))
+    for name, samples in stages:
+        if not samples:
+            print("{:<12}{:>6}".format(name, 0))
+            continue
+        s = summarize(samples)
+        print(
+            "{:<12}{:>6}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}".format(
+                name, s["n"], s["mean"], s["p50"], s["p90"], s["p99"], s["max"]
+            )
+        )
+    print("frames lost or unreadable : {}".format(lost))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Glass-to-glass latency of the autopilot (times in ms)")
+    parser.add_argument("--target", required=True, help="image of a face (or person) the autopilot follows")
+    parser.add_argument("--mode", choices=("face", "person"), default="face")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds before jumps are counted")
+    parser.add_argument("--period", type=float, default=2.0, help="seconds between target jumps")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    parser.add_argument("--port", type=int, default=8080, help="port of the headless server")
+    args = parser.parse_args()
+
+    target = cv2.imread(args.target)
+    if target is None:
+        print("Could not read {}".format(args.target))
+        return 2
+    scale = min(1.0, (FRAME_SIZE[0] / 3) / target.shape[1], (FRAME_SIZE[1] * 0.8) / target.shape[0])
+    target = cv2.resize(target, None, fx=scale, fy=scale)
+
+    # the autopilot talks to the fake drone on localhost
+    Tello.UDP_IP = "127.0.0.1"
+    Tello.UDP_PORT = FAKE_DRONE_PORT
+    source = MarkerSource(target, fps=args.fps, period=args.period, ffmpeg=args.ffmpeg)
+    drone = FakeDrone(on_streamon=source.start).start()
+    game = tello_fast_game.Game(headless=True, port=args.port)
+    runner = threading.Thread(target=game.run, args=(), name="autopilot", daemon=True)
+    runner.start()
+    while game.drone.tello.background_frame_read is None:
+        time.sleep(0.1)
+    reader = MarkerReader(game.drone.tello.background_frame_read).start()
+    game.control("P" if args.mode == "person" else "F", "up")
+
+    time.sleep(args.warmup + args.duration)
+    source.stop()
+    reader.stopped = True
+    game.should_stop = True
+    runner.join(timeout=5)
+    drone.stopped = True
+
+    sent = dict(source.sent)
+    decoded = dict(reader.decoded)
+    transport = [decoded[seq] - sent[seq] for seq in decoded if seq in sent]
+    total, pipeline = responses(list(source.jumps), list(drone.rc), decoded, args.warmup, args.period)
+    print_report(
+        [("transport", transport), ("pipeline", pipeline), ("total", total)],
+        lost=len(sent) - len(transport),
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
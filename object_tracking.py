@@ -2,8 +2,10 @@
 import cv2
 import sdl2
 import sdl2.ext
-import numpy
 from ImageProcessing.yolov3 import Yolo
+from ImageProcessing.trackers import TrackerSelector
+from ImageProcessing.display import BGRADisplay
+from ImageProcessing.overlay import Overlay
 
 yolo = Yolo()
 yolo.initializeModel()
@@ -22,14 +24,17 @@ window = sdl2.ext.Window("test", size=windowSize)
 window.show()
 windowSurf = sdl2.SDL_GetWindowSurface(window.window)
 windowArray = sdl2.ext.pixels3d(windowSurf.contents)
+display = BGRADisplay(windowArray, mirror=True)
+overlay = Overlay()
 
 
-tracker = cv2.TrackerCSRT().create()
+tracker = TrackerSelector(initial="CSRT")
 running = True
 start_tracker = False
 detected = False
 while running:  # keep reading to have a live feed from the cam
     junk, image = vc.read()
+    overlay.clear()
     events = sdl2.ext.get_events()
     for event in events:
         if event.type == sdl2.SDL_KEYDOWN:
@@ -44,9 +49,8 @@ while running:  # keep reading to have a live feed from the cam
                 running = False
                 break
     if detected == False and start_tracker == True:
-        boxes, conf, classes, image = yolo.detect(image, "person", return_img=True)
-        del tracker
-        tracker = cv2.TrackerCSRT().create()
+        boxes, conf, classes = yolo.detect(image, "person")
+        overlay.detections(boxes, conf, classes)
         if len(classes) > 0:
             detected = True
             tracker.init(image, (boxes[0][0], boxes[0][1], boxes[0][2], boxes[0][3]))
@@ -54,12 +58,8 @@ while running:  # keep reading to have a live feed from the cam
         ok, bbox = tracker.update(image)
         if ok:
             # Tracking success
-            p1 = (int(bbox[0]), int(bbox[1]))
-            p2 = (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3]))
-            cv2.rectangle(image, p1, p2, (255, 0, 0), 2, 1)
+            overlay.rectangle(bbox, (255, 0, 0), 2)
         else:
             detected = False
-    image = numpy.insert(image, 3, 255, axis=2)  # add alpha
-    image = numpy.rot90(image)  # rotate dims
-    numpy.copyto(windowArray, image)
+    display.show(image, overlay)
     window.refresh()
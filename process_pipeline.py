@@ -0,0 +1,238 @@
+# Runs video capture and inference in their own processes, next to the control/UI process.
+#
+#   python tello_fast_game.py --processes
+#
+#   capture process    decodes the H.264 stream and writes every frame to a FrameBus
+#   inference process  runs yolo / the haar face detector on the frames it is asked for
+#   control/UI process the Game: tracking, follow controller, HUD, display, commands
+#
+# Frames cross process borders only through the shared memory ring, the queues carry
+# (kind, frame_id, force) requests and the detection results. The frame id of a frame is its
+# sequence number on the bus, so a result always names the exact frame it was computed
+# on and the control process can pick that frame up again from the ring.
+import multiprocessing
+import os
+import queue
+import time
+
+import cv2
+
+from ImageProcessing.detection_cache import filter_detections
+from ImageProcessing.face_detector import FaceDetector
+from ImageProcessing.motion_gate import MotionGate
+from ImageProcessing.yolov3 import Yolo
+from djitellopy.frame_bus import FrameBus
+from djitellopy.metrics import metrics
+
+YOLO = "yolo"
+FACES = "faces"
+
+
+def capture_main(bus_name, address, stop):
+    """Capture process: decodes the video stream at address into the bus until stop is set"""
+    bus = FrameBus(bus_name)
+    cap = cv2.VideoCapture(address)
+    if not cap.isOpened():
+        cap.open(address)
+    while not stop.is_set():
+        grabbed, frame = cap.read()
+        if not grabbed:
+            break
+        bus.write(frame, time.time())
+    bus.close_stream()
+    cap.release()
+    bus.close()
+
+
+def inference_main(bus_name, requests, results, threads, face_scale):
+    """Inference process: answers (kind, frame_id, force) requests with (kind, frame_id, frame_time, result, seconds)"""
+    # the DNN forward pass gets the cores the other two processes leave
+    cv2.setNumThreads(threads)
+    bus = FrameBus(bus_name)
+    yolo = None
+    face_detector = None
+    face_gate = MotionGate()
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        kind, frame_id, force = request
+        item = bus.read(frame_id)
+        if item is None:
+            # overwritten while queued, the newest frame is the better answer anyway
+            frame_id = bus.latest
+            item = bus.read(frame_id)
+        if item is None:
+            results.put((kind, frame_id, None, None, 0.0))
+            continue
+        frame, frame_time = item
+        start = time.perf_counter()
+        if kind == YOLO:
+            if yolo is None:
+                yolo = Yolo()
+                yolo.initializeModel()
+            result = yolo.detectAll(frame, frame_id=frame_id, force=force)
+        else:
+            if face_detector is None:
+                face_detector = FaceDetector(roi_scale=face_scale, full_scales=(face_scale,))
+            result = face_gate.run(frame, face_detector.detect, force=force)
+        results.put((kind, frame_id, frame_time, result, time.perf_counter() - start))
+    bus.close()
+
+
+class BusFrameRead:
+    """BackgroundFrameRead for the control process, reads the newest frame from the bus"""
+
+    def __init__(self, bus, tello=None):
+        self.bus = bus
+        self.tello = tello
+        self.latest = (0, None, time.time())
+        self.stopped = False
+
+    def read(self):
+        return self.read_stamped()[:2]
+
+    def read_stamped(self):
+        """Returns (frame_id, frame, timestamp) of the newest frame, the frame is a private copy"""
+        seq = self.bus.latest
+        if seq != self.latest[0]:
+            item = self.bus.read(seq)
+            if item is not None:
+                self.latest = (seq, item[0], item[1])
+                recorder = self.tello.recorder if self.tello is not None else None
+                if recorder is not None:
+                    recorder.record_frame(seq, item[0], item[1])
+        if self.bus.closed:
+            self.stopped = True
+        return self.latest
+
+    def stop(self):
+        self.stopped = True
+
+
+class RemoteDetector:
+    """
+    Stands in for Yolo and FaceDetector in the control process. Each call hands the
+    current frame id to the inference process, unless it is still busy with an
+    earlier one, and returns the newest finished result. Results lag the current
+    frame by the inference time; frame and frame_time belong to the frame the last
+    returned result was computed on. A result older than max_age seconds, or whose
+    frame the ring already overwrote, is dropped (counted as stale): it answers a
+    request made long ago, e.g. before the tracker went on without detections.
+    """
+
+    def __init__(self, bus, requests, results, max_age=0.5, clock=time.time):
+        self.bus = bus
+        self.requests = requests
+        self.results = results
+        self.max_age = max_age
+        self.clock = clock  # time base of the bus frame times
+        self.pending = {YOLO: False, FACES: False}
+        self.finished = {}
+        self.frame = None
+        self.frame_time = None
+        self.counts = {YOLO: 0, FACES: 0, "lost": 0, "stale": 0}
+
+    def poll(self):
+        while True:
+            try:
+                kind, frame_id, frame_time, result, seconds = self.results.get_nowait()
+            except queue.Empty:
+                return
+            self.pending[kind] = False
+            if result is None:
+                self.counts["lost"] += 1
+                continue
+            metrics.observe("inference", seconds)
+            self.finished[kind] = (frame_id, frame_time, result)
+
+    def take(self, kind, frame_id, force=False):
+        """Requests kind for frame_id, returns the newest unseen result of kind or None"""
+        self.poll()
+        if not self.pending[kind] and frame_id is not None:
+            self.requests.put((kind, frame_id, force))
+            self.pending[kind] = True
+        if kind not in self.finished:
+            return None
+        result_id, result_time, result = self.finished.pop(kind)
+        age = self.clock() - result_time
+        item = self.bus.read(result_id) if age <= self.max_age else None
+        if item is None:
+            self.frame = self.frame_time = None
+            self.counts["stale"] += 1
+            return None
+        self.counts[kind] += 1
+        self.frame, self.frame_time = item[0], result_time
+        metrics.observe("detection_age", age)
+        return result
+
+    def detect(self, image, object_name, frame_id=None, force=False):
+        """As Yolo.detect, but None while the inference process has no new result"""
+        result = self.take(YOLO, frame_id, force)
+        return None if result is None else filter_detections(result, object_name)
+
+    def detect_faces(self, frame_id):
+        """Faces of the newest finished face detection, [] while there is none"""
+        result = self.take(FACES, frame_id)
+        return [] if result is None else result
+
+    def stats(self):
+        return dict(self.counts)
+
+
+class ProcessPipeline:
+    """
+    Owns the frame bus, the capture and inference processes and the queues between
+    them. start() after streamon, like Tello.get_frame_read(); frame_read and
+    detector are then used by the Game in place of BackgroundFrameRead and Yolo.
+    """
+
+    def __init__(self, address, tello=None, slots=16, shape=(720, 960, 3), inference_threads=None, face_scale=0.5):
+        # spawn: the children must not inherit SDL, sockets or running threads
+        context = multiprocessing.get_context("spawn")
+        # 16 slots hold about half a second at 30fps, longer than one inference
+        self.bus = FrameBus(slots=slots, shape=shape)
+        self.stop_event = context.Event()
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        threads = inference_threads or max(1, (os.cpu_count() or 1) - 2)
+        self.capture = context.Process(
+            target=capture_main, args=(self.bus.name, address, self.stop_event), name="frame-capture", daemon=True
+        )
+        self.inference = context.Process(
+            target=inference_main,
+            args=(self.bus.name, self.requests, self.results, threads, face_scale),
+            name="inference",
+            daemon=True,
+        )
+        self.frame_read = BusFrameRead(self.bus, tello)
+        self.detector = RemoteDetector(self.bus, self.requests, self.results)
+        self.started = False
+
+    def start(self, timeout=10):
+        """Starts both processes and waits for the first frame, like BackgroundFrameRead does"""
+        if not self.started:
+            self.capture.start()
+            self.inference.start()
+            self.started = True
+            if self.bus.wait(timeout=timeout) is None:
+                self.frame_read.stop()
+            else:
+                self.frame_read.read_stamped()
+        return self
+
+    def stop(self):
+        if self.bus is None:
+            return
+        if self.started:
+            self.stop_event.set()
+            self.requests.put(None)
+            for process in (self.capture, self.inference):
+                process.join(timeout=2)
+                if process.is_alive():
+                    process.terminate()
+        self.bus.close()
+        self.bus = None
+
+    def stats(self):
+        return dict(self.detector.stats(), frames=self.frame_read.latest[0])
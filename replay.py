@@ -0,0 +1,267 @@
+# Replays a recorded flight through the autopilot, without drone, window or sleeps.
+#
+#   python replay.py flight.avi --telemetry tello_status.log --mode person
+#   python replay.py flight.avi --mode face --output commands.csv
+#   python replay.py recordings/flight1 --seek 60 --length 30   # FlightRecorder directory
+#
+# Frames are fed to the same Game.aquire_lock_person / aquire_lock_face code as in
+# flight, the follow controller is stepped at its rate on the recording time and
+# every rc command it would have sent is written out as csv
+# (time, frame_id, left_right, for_back, up_down, yaw). Runs as fast as the
+# CPU allows, the summary shows the speed relative to real time.
+import argparse
+import bisect
+import csv
+import os
+import sys
+import time
+from datetime import datetime
+
+import cv2
+
+from tello_fast_game import Drone, Game, FACE_FOLLOW, PERSON_FOLLOW
+from djitellopy.recording import FlightRecording
+from djitellopy.tello import TelloStatus
+from ImageProcessing.trackers import TRACKERS
+
+STATUS_FIELDS = [
+    "pitch", "roll", "yaw", "vgx", "vgy", "vgz", "templ", "temph",
+    "tof", "h", "bat", "baro", "time", "agx", "agy", "agz",
+]
+
+
+class ReplayClock:
+    """Recording time, advanced by the replay loop"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Telemetry:
+    """State samples of a flight, looked up by time"""
+
+    def __init__(self, samples=()):
+        samples = sorted(samples, key=lambda sample: sample[0])
+        self.times = [t for t, _ in samples]
+        self.states = [state for _, state in samples]
+
+    @classmethod
+    def from_status_log(cls, path):
+        """Reads tello_status.log, lines are '<asctime> - telloStatus - INFO - pitch = -2\\t roll = 1 ...'"""
+        samples = []
+        with open(path) as f:
+            for line in f:
+                parts = line.split(" - ", 3)
+                if len(parts) < 4:
+                    continue
+                try:
+                    t = datetime.strptime(parts[0], "%Y-%m-%d %H:%M:%S,%f").timestamp()
+                except ValueError:
+                    continue
+                state = {}
+                for field in parts[3].split("\t"):
+                    key, _, value = field.partition("=")
+                    try:
+                        state[key.strip()] = float(value)
+                    except ValueError:
+                        pass
+                if state:
+                    samples.append((t, state))
+        return cls(samples)
+
+    def index_at(self, t):
+        return bisect.bisect_right(self.times, t) - 1
+
+    def state_at(self, t):
+        """Latest state received at or before t, empty before the first sample"""
+        i = self.index_at(t)
+        return self.states[i] if i >= 0 else {}
+
+    def yaw_at(self, t):
+        """Yaw interpolated between the samples around t, as TelloStatusRead.yaw_at"""
+        i = self.index_at(t)
+        if i < 0:
+            return self.states[0].get("yaw") if self.states else None
+        if i + 1 >= len(self.times):
+            return self.states[i].get("yaw")
+        yaw0, yaw1 = self.states[i].get("yaw"), self.states[i + 1].get("yaw")
+        if yaw0 is None or yaw1 is None:
+            return yaw0
+        t0, t1 = self.times[i], self.times[i + 1]
+        if t1 == t0:
+            return yaw1
+        delta = (yaw1 - yaw0 + 180) % 360 - 180
+        return yaw0 + delta * (t - t0) / (t1 - t0)
+
+
+class ReplayTello:
+    """
+    The parts of Tello the autopilot uses, answered from the recording.
+    telemetry is a Telemetry or a FlightRecording (state_at and yaw_at).
+    """
+
+    def __init__(self, telemetry, clock):
+        self.telemetry = telemetry
+        self.clock = clock
+        self.frame_id = None  # latest frame processed when a command is sent
+        self.commands = []  # (time, frame_id, [left_right, for_back, up_down, yaw])
+
+    def get_last_state(self):
+        return dict(self.telemetry.state_at(self.clock()))
+
+    def get_tello_status(self):
+        status = TelloStatus()
+        for key, value in self.telemetry.state_at(self.clock()).items():
+            if key in STATUS_FIELDS:
+                setattr(status, key, value)
+        return status
+
+    def get_height_status(self):
+        return int(self.telemetry.state_at(self.clock()).get("h", 0))
+
+    def get_yaw_at(self, timestamp):
+        return self.telemetry.yaw_at(timestamp)
+
+    def send_rc_control(self, left_right_velocity, forward_backward_velocity, up_down_velocity, yaw_velocity):
+        self.commands.append(
+            (
+                self.clock(),
+                self.frame_id,
+                [left_right_velocity, forward_backward_velocity, up_down_velocity, yaw_velocity],
+            )
+        )
+        return True
+
+    def land(self):
+        return True
+
+    def end(self):
+        pass
+
+
+def frames(path, start, fps=None):
+    """(frame_id, frame, timestamp) of a video file, timestamps from start at the file's frame rate"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError("Could not open {}".format(path))
+    fps = fps or cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_id = 0
+    while True:
+        grabbed, frame = cap.read()
+        if not grabbed:
+            break
+        yield frame_id, frame, start + frame_id / fps
+        frame_id += 1
+    cap.release()
+
+
+class Replay:
+    """Runs a Game on recorded frames with a simulated clock"""
+
+    def __init__(self, telemetry, mode=PERSON_FOLLOW, tracker="KCF"):
+        self.clock = ReplayClock()
+        self.tello = ReplayTello(telemetry, self.clock)
+        self.game = Game(headless=True, drone=Drone(tello=self.tello), clock=self.clock)
+        # the video delay is already part of the recorded frame times
+        self.game.video_delay = 0.0
+        # the selector switches backends on measured (wall clock) update times, which would make
+        # the commands depend on the machine, so replays run one fixed backend
+        self.game.tracker_backend = tracker
+        self.mode = mode
+        self.controller = self.game.follow_controller
+        self.next_step = None
+        self.frame_count = 0
+
+    def step_controller(self, until):
+        """Runs the follow controller steps due before time until"""
+        while self.next_step < until:
+            self.clock.now = self.next_step
+            self.controller.step(self.next_step)
+            self.next_step += self.controller.period
+
+    def feed(self, frame_id, frame, timestamp):
+        if self.next_step is None:
+            self.clock.now = timestamp
+            self.next_step = timestamp
+            self.game.setMode(self.mode)
+        self.step_controller(timestamp)
+        self.clock.now = timestamp
+        game = self.game
+        game.frame_id, game.image, game.frame_time = frame_id, frame, timestamp
+        game.overlay.clear()
+        if game.mode != None:
+            game.mode_updates()
+        game.update()
+        self.tello.frame_id = frame_id
+        self.frame_count += 1
+
+    def finish(self):
+        if self.next_step is not None:
+            self.step_controller(self.clock.now + self.controller.period)
+        self.game.setMode(None)
+        return self.tello.commands
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded flight through the autopilot")
+    parser.add_argument("video", help="recorded video file or FlightRecorder directory")
+    parser.add_argument("--telemetry", help="tello_status.log of the flight")
+    parser.add_argument("--start", help="time of the first frame, 'YYYY-mm-dd HH:MM:SS.fff' (default first telemetry sample)")
+    parser.add_argument("--fps", type=float, help="frame rate of the video, overrides the file's")
+    parser.add_argument("--seek", type=float, default=0.0, help="seconds into a recording directory to start at")
+    parser.add_argument("--length", type=float, help="seconds of a recording directory to replay")
+    parser.add_argument("--mode", choices=("person", "face"), default="person")
+    parser.add_argument("--tracker", choices=list(TRACKERS), default="KCF", help="tracker backend, fixed for the replay")
+    parser.add_argument("--output", help="csv file for the commands (default stdout)")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.video):
+        # frames and telemetry with their recorded times, seeking is a binary search
+        telemetry = FlightRecording(args.video)
+        # None for a recording that holds no samples at all, frames() then yields nothing
+        start = telemetry.start + args.seek if telemetry.start is not None else None
+        end = start + args.length if start is not None and args.length is not None else None
+        source = telemetry.frames(start, end)
+    else:
+        telemetry = Telemetry.from_status_log(args.telemetry) if args.telemetry else Telemetry()
+        if args.start:
+            start = datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S.%f").timestamp()
+        elif telemetry.times:
+            start = telemetry.times[0]
+        else:
+            start = 0.0
+        source = frames(args.video, start, args.fps)
+
+    replay = Replay(telemetry, PERSON_FOLLOW if args.mode == "person" else FACE_FOLLOW, args.tracker)
+    wall_start = time.perf_counter()
+    first = last = None
+    for frame_id, frame, timestamp in source:
+        first = timestamp if first is None else first
+        last = timestamp
+        replay.feed(frame_id, frame, timestamp)
+    commands = replay.finish()
+    wall = time.perf_counter() - wall_start
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    writer = csv.writer(out)
+    writer.writerow(["time", "frame_id", "left_right", "for_back", "up_down", "yaw"])
+    for t, frame_id, velocities in commands:
+        writer.writerow(["{:.3f}".format(t), frame_id] + velocities)
+    if args.output:
+        out.close()
+
+    duration = (last - first) if first is not None else 0.0
+    print(
+        "{} frames, {:.1f}s of flight replayed in {:.1f}s ({:.1f}x real time), {} commands".format(
+            replay.frame_count, duration, wall, duration / wall if wall else 0.0, len(commands)
+        ),
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
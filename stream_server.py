@@ -0,0 +1,321 @@
+# Local HTTP server for running the autopilot without a window.
+#
+#   GET  /         viewer page
+#   GET  /video    annotated video as MJPEG (multipart/x-mixed-replace)
+#   GET  /status   current status as JSON
+#   GET  /metrics  stage latency histograms in Prometheus text format (when enabled)
+#   POST /control  {"key": "Up", "event": "down"}, key names as in SDL_GetKeyName
+#
+# /control changes the flight state, so it only accepts POST with a JSON body (a cross
+# site page can not send that without a CORS preflight, which is never answered) and
+# rejects requests whose Origin is not the server itself. Without a token only
+# loopback Host names are accepted (no DNS rebinding) and the server must listen on
+# loopback; with a token, clients send "Authorization: Bearer <token>" and the viewer
+# page is opened as http://<host>:<port>/#token=<token>. /video, /status and /metrics
+# show the camera and telemetry, they take the same Host and token checks (the token
+# may also come as ?token=<token>, an <img> can not send headers); only the viewer
+# page itself, which holds no data, is served to anyone.
+import hmac
+import ipaddress
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+
+from djitellopy.metrics import metrics
+from djitellopy.tello import setup_logger
+from ImageProcessing.display import Display
+
+server_log = setup_logger("streamServer", "stream_server.log")
+
+BOUNDARY = "frame"
+
+VIEWER_PAGE = """<html><head><title>Tello</title></head><body>
+<img id="video"><pre id="status"></pre>
+<script>
+var token = new URLSearchParams(location.hash.slice(1)).get("token");
+var auth = token ? {"Authorization": "Bearer " + token} : {};
+document.getElementById("video").src = "/video" + (token ? "?token=" + encodeURIComponent(token) : "");
+setInterval(function () {
+  fetch("/status", {headers: auth}).then(r => r.json()).then(s => {
+    document.getElementById("status").textContent = JSON.stringify(s, null, 2);
+  });
+}, 500);
+function send(key, event) {
+  var headers = Object.assign({"Content-Type": "application/json"}, auth);
+  fetch("/control", {method: "POST", headers: headers, body: JSON.stringify({key: key, event: event})});
+}
+document.addEventListener("keydown", e => { if (!e.repeat) send(e.key, "down"); });
+document.addEventListener("keyup", e => send(e.key, "up"));
+</script></body></html>
+"""
+
+LOOPBACK_NAMES = ("localhost", "127.0.0.1", "[::1]")
+
+# browser KeyboardEvent.key -> SDL key name
+BROWSER_KEYS = {
+    "ArrowUp": "Up",
+    "ArrowDown": "Down",
+    "ArrowLeft": "Left",
+    "ArrowRight": "Right",
+}
+
+
+class FrameStreamer:
+    """
+    JPEG encoder for the video stream. Frames are only accepted while a client
+    is connected and at most max_fps times per second; a worker thread encodes
+    the newest accepted frame, frames arriving while it is busy replace each
+    other so the stream never lags behind.
+    """
+
+    def __init__(self, max_fps=15, quality=70):
+        self.period = 1.0 / max_fps
+        self.quality = quality
+        self.clients = 0
+        self.condition = threading.Condition()
+        self.pending = None
+        self.jpeg = None
+        self.sequence = 0  # increases with every encoded frame
+        self.last_accepted = 0.0
+        self.encode_time = 0.0
+        self.stopped = True
+
+    def wants_frame(self):
+        return self.clients > 0 and time.monotonic() - self.last_accepted >= self.period
+
+    def publish(self, image):
+        """image must not be modified afterwards, the worker encodes it later"""
+        with self.condition:
+            self.pending = image
+            self.last_accepted = time.monotonic()
+            self.condition.notify_all()
+
+    def start(self):
+        self.stopped = False
+        threading.Thread(target=self.encode_loop, args=(), name="jpeg-encoder", daemon=True).start()
+        return self
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def encode_loop(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                image, self.pending = self.pending, None
+            start = time.perf_counter()
+            ok, data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            self.encode_time = time.perf_counter() - start
+            if not ok:
+                continue
+            with self.condition:
+                self.jpeg = data.tobytes()
+                self.sequence += 1
+                self.condition.notify_all()
+
+    def next_jpeg(self, after, timeout=1.0):
+        """Waits for a frame newer than sequence number after, returns (sequence, jpeg)"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence > after or self.stopped, timeout)
+            return self.sequence, self.jpeg
+
+
+class StreamDisplay(Display):
+    """Display that feeds a FrameStreamer instead of a window"""
+
+    def __init__(self, streamer):
+        super().__init__()
+        self.streamer = streamer
+
+    def show(self, image, overlay=None):
+        # nothing to draw or copy when nobody watches or the client rate is reached
+        if not self.streamer.wants_frame():
+            return 0.0
+        return super().show(image, overlay)
+
+    def write(self, image):
+        # the reused overlay buffer or the shared frame would change under the encoder
+        self.streamer.publish(image.copy())
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class StreamServer:
+    """
+    Serves the stream of a FrameStreamer and a small control API.
+    status() returns a JSON serializable dict, control(key_name, event) is
+    called with event "down" or "up" and returns False for unknown keys.
+    token is required for listening on anything but loopback.
+    """
+
+    def __init__(self, status, control, host="127.0.0.1", port=8080, max_fps=15, quality=70, token=None):
+        if token is None and not is_loopback(host):
+            raise ValueError("Serving flight control on {} needs a token".format(host))
+        self.status = status
+        self.control = control
+        self.address = (host, port)
+        self.token = token
+        self.streamer = FrameStreamer(max_fps=max_fps, quality=quality)
+        self.httpd = None
+
+    def start(self):
+        handler = type("Handler", (StreamRequestHandler,), {"server_ref": self})
+        self.httpd = ThreadingHTTPServer(self.address, handler)
+        self.httpd.daemon_threads = True
+        self.streamer.start()
+        threading.Thread(target=self.httpd.serve_forever, args=(), daemon=True).start()
+        server_log.info("Serving on http://{}:{}/".format(*self.address))
+        return self
+
+    def stop(self):
+        self.streamer.stop()
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+
+class StreamRequestHandler(BaseHTTPRequestHandler):
+    server_ref = None
+
+    def log_message(self, format, *args):
+        message = format % args
+        if self.server_ref.token:
+            # request lines can hold ?token=
+            message = message.replace(self.server_ref.token, "***")
+        server_log.debug(message)
+
+    def send_body(self, code, body, content_type):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, code, value):
+        self.send_body(code, json.dumps(value).encode(), "application/json")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path in ("/video", "/status", "/metrics"):
+            error = self.check_access(parse_qs(url.query).get("token", [None])[0])
+            if error is not None:
+                server_log.warning(
+                    "Request for {} from {} rejected : {}".format(url.path, self.client_address[0], error[1])
+                )
+                self.send_json(error[0], {"error": error[1]})
+                return
+        if url.path == "/":
+            self.send_body(200, VIEWER_PAGE.encode(), "text/html")
+        elif url.path == "/video":
+            self.stream_video()
+        elif url.path == "/status":
+            self.send_json(200, self.server_ref.status())
+        elif url.path == "/metrics" and metrics.enabled:
+            self.send_body(200, metrics.render().encode(), "text/plain; version=0.0.4")
+        elif url.path == "/control":
+            self.send_json(405, {"error": "use POST with a json body"})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/control":
+            self.send_json(404, {"error": "not found"})
+            return
+        error = self.check_control_request()
+        if error is not None:
+            server_log.warning("Control request from {} rejected : {}".format(self.client_address[0], error[1]))
+            self.send_json(error[0], {"error": error[1]})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            command = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_json(400, {"error": "body is not json"})
+            return
+        self.handle_control(command)
+
+    def check_control_request(self):
+        """(status, reason) why a control request must be rejected, None if it is allowed"""
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            return 415, "Content-Type must be application/json"
+        host = self.headers.get("Host", "")
+        origin = self.headers.get("Origin")
+        if origin is not None and origin not in ("http://" + host, "https://" + host):
+            return 403, "foreign origin {}".format(origin)
+        return self.check_access()
+
+    def check_access(self, query_token=None):
+        """(status, reason) why the client may not see or steer the drone, None if it may"""
+        token = self.server_ref.token
+        if token is None:
+            host = self.headers.get("Host", "")
+            name = host.rsplit(":", 1)[0] if not host.endswith("]") else host
+            if name not in LOOPBACK_NAMES:
+                return 403, "host {} is not loopback".format(host)
+            return None
+        expected = "Bearer {}".format(token).encode()
+        if hmac.compare_digest(self.headers.get("Authorization", "").encode(), expected):
+            return None
+        if query_token is not None and hmac.compare_digest(query_token.encode(), token.encode()):
+            return None
+        return 401, "missing or wrong token"
+
+    def handle_control(self, command):
+        key = command.get("key")
+        event = command.get("event", "up")
+        if not key or event not in ("down", "up"):
+            self.send_json(400, {"error": "expected key and event (down or up)"})
+            return
+        key = BROWSER_KEYS.get(key, key)
+        if not self.server_ref.control(key, event):
+            self.send_json(400, {"error": "unknown key {}".format(key)})
+            return
+        self.send_json(200, {"ok": True})
+
+    def stream_video(self):
+        streamer = self.server_ref.streamer
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary={}".format(BOUNDARY))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        with streamer.condition:
+            streamer.clients += 1
+        server_log.info("Video client {} connected".format(self.client_address[0]))
+        try:
+            sequence = streamer.sequence
+            while not streamer.stopped:
+                new_sequence, jpeg = streamer.next_jpeg(sequence)
+                if new_sequence == sequence or jpeg is None:
+                    continue
+                sequence = new_sequence
+                self.wfile.write(
+                    "--{}\r\nContent-Type: image/jpeg\r\nContent-Length: {}\r\n\r\n".format(
+                        BOUNDARY, len(jpeg)
+                    ).encode()
+                )
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with streamer.condition:
+                streamer.clients -= 1
+            server_log.info("Video client {} disconnected".format(self.client_address[0]))
@@ -1,10 +1,26 @@
 from djitellopy import Tello
-import cv2
+from djitellopy.tello import AltitudeTarget
+from djitellopy.controller import FollowController
+from djitellopy.metrics import metrics
+from djitellopy.profiler import SamplingProfiler
 import sdl2
 import sdl2.ext
+import argparse
+import queue
 import time
-import numpy
 from ImageProcessing.yolov3 import Yolo
+from ImageProcessing.motion_gate import MotionGate
+from ImageProcessing.trackers import ScaledTracker, TrackerSelector
+from ImageProcessing.multi_tracker import MultiObjectTracker, iou
+from ImageProcessing.redetect_scheduler import RedetectScheduler
+from ImageProcessing.kalman import BoxKalmanFilter
+from ImageProcessing.appearance import AppearanceSignature
+from ImageProcessing.ego_motion import EgoMotionTracker
+from ImageProcessing.face_detector import FaceDetector
+from ImageProcessing.display import BGRADisplay
+from ImageProcessing.overlay import Overlay
+from stream_server import StreamDisplay, StreamServer
+from process_pipeline import ProcessPipeline
 import logging
 
 formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
@@ -28,8 +44,8 @@ logger = setup_logger("logger", "tello_fast_game.log")
 
 
 class Drone(object):
-    def __init__(self):
-        self.tello = Tello()
+    def __init__(self, tello=None):
+        self.tello = Tello() if tello is None else tello
         self.yaw_velocity = 0
         self.for_back_velocity = 0
         self.left_right_velocity = 0
@@ -64,51 +80,235 @@ class Drone(object):
                 self.up_down_velocity = 0
 
 
+# Autopilot modes
+PERSON_FOLLOW = "Person follow"
+FACE_FOLLOW = "Face follow"
+AQUIRE_FACE = "Aquire Face"
+GO_TO_GROUND = "Go to ground"
+
+
+class Mode(object):
+    """
+    An autopilot mode. tick() is called once per frame from the main loop, does
+    a bounded amount of work and returns the mode to continue with (its own
+    name to stay, None to leave autopilot). It must never block.
+    """
+
+    name = None
+
+    def __init__(self, game):
+        self.game = game
+        self.drone = game.drone
+
+    def enter(self):
+        pass
+
+    def tick(self):
+        return self.name
+
+    def exit(self):
+        pass
+
+
+class FollowMode(Mode):
+    def enter(self):
+        self.game.detected = False
+        self.game.box_filter.reset()
+        self.game.target_signature.clear()
+
+    def exit(self):
+        self.game.follow_controller.clear_target()
+        self.drone.setZero()
+        self.game.logGateStats()
+
+
+class PersonFollowMode(FollowMode):
+    name = PERSON_FOLLOW
+
+    def tick(self):
+        self.game.aquire_lock_person()
+        return self.name
+
+
+class FaceFollowMode(FollowMode):
+    name = FACE_FOLLOW
+
+    def tick(self):
+        self.game.aquire_lock_face()
+        return self.name
+
+
+class AquireFaceMode(Mode):
+    """Climbs to search_height, then yaws until a face is seen and switches to face follow"""
+
+    name = AQUIRE_FACE
+    search_height = 80
+    climb_timeout = 12  # seconds
+
+    def enter(self):
+        self.game.initializeFaceFinder()
+        self.state = "climb"
+        self.climb = AltitudeTarget.to_height(self.search_height, max_speed=self.drone.S)
+        self.started = self.game.clock()
+        self.drone.send_rc_control = True
+
+    def tick(self):
+        if self.state == "climb":
+            self.drone.up_down_velocity = self.climb.step(self.drone.tello.get_last_state())
+            if self.climb.reached or self.game.clock() - self.started > self.climb_timeout:
+                self.drone.up_down_velocity = 0
+                self.state = "search"
+            return self.name
+        self.drone.yaw_velocity = self.drone.S
+        # the detector is the expensive part, skip it when the tick is already over budget
+        if self.game.tickTimeLeft() <= 0:
+            return self.name
+        with metrics.timer("detection"):
+            faces = self.game.findFaces()
+        if len(faces) > 0:
+            return FACE_FOLLOW
+        return self.name
+
+    def exit(self):
+        self.drone.setZero()
+
+
+class GoToGroundMode(Mode):
+    """Descends until the drone has settled about 20cm above ground (height or tof), then stops sending rc"""
+
+    name = GO_TO_GROUND
+    timeout = 12  # seconds
+
+    def enter(self):
+        self.started = self.game.clock()
+        self.descent = AltitudeTarget.to_ground(speed=self.drone.S)
+        self.drone.setZero()
+        self.drone.send_rc_control = True
+
+    def tick(self):
+        self.drone.up_down_velocity = self.descent.step(self.drone.tello.get_last_state())
+        if self.descent.reached or self.game.clock() - self.started > self.timeout:
+            return None
+        return self.name
+
+    def exit(self):
+        self.drone.setZero()
+        self.drone.send_rc_control = False
+        logger.info("Got to Ground")
+
+
 class Game(object):
-    def __init__(self):
+    def __init__(
+        self,
+        headless=False,
+        host="127.0.0.1",
+        port=8080,
+        drone=None,
+        clock=time.time,
+        processes=False,
+        token=None,
+    ):
         self.windowSize = (960, 720)
-        # initialize sdl2 game window
-        sdl2.ext.init()
-        self.window = sdl2.ext.Window("test", size=self.windowSize)
-        self.window.show()
-        windowSurf = sdl2.SDL_GetWindowSurface(self.window.window)
-        self.windowArray = sdl2.ext.pixels3d(windowSurf.contents)
+        # time source of the autopilot logic, replay.py substitutes the recording time
+        self.clock = clock
+        self.headless = headless
+        self.window = None
+        self.server = None
+        if headless:
+            # video and status over http, keys arrive through the control api
+            self.server = StreamServer(self.status, self.control, host=host, port=port, token=token)
+            self.control_events = queue.Queue()
+            self.display = StreamDisplay(self.server.streamer)
+        else:
+            # initialize sdl2 game window
+            sdl2.ext.init()
+            self.window = sdl2.ext.Window("test", size=self.windowSize)
+            self.window.show()
+            windowSurf = sdl2.SDL_GetWindowSurface(self.window.window)
+            self.windowArray = sdl2.ext.pixels3d(windowSurf.contents)
+            # converts frames straight into the window surface
+            self.display = BGRADisplay(self.windowArray)
+        # boxes and status text, composited at display time so self.image stays clean
+        self.overlay = Overlay()
         self.image = None
+        self.frame_id = None
+        self.frame_time = None
         # Init Tello object that interacts with the Tello drone
-        self.drone = Drone()
+        self.drone = Drone() if drone is None else drone
         self.mode = None
         self.yolo_initialized = False
         self.tracker_initialized = False
         self.face_finder_initialized = False
+        self.face_scale = 0.5  # frame scale used by the face detector
         self.FPS = 25
+        self.tick_budget = 1 / self.FPS  # seconds of work per main loop iteration
+        self.tick_deadline = None
+        self.modes = {
+            mode.name: mode(self)
+            for mode in (PersonFollowMode, FaceFollowMode, AquireFaceMode, GoToGroundMode)
+        }
         self.follow_obj = "person"
-        self.yolo_tracker_sync_time = 4  # time to run yolo once every _3_ sec
-        self.yolo_tracker_last_sync = time.time()
+        self.yolo_tracker_sync_time = 4  # run yolo at least every _4_ sec while tracking
+        # runs yolo early when tracking degrades, rarely when it is stable
+        self.redetect = RedetectScheduler(max_interval=self.yolo_tracker_sync_time)
+        self.tracker_reinit_iou = 0.5  # re-initialize the tracker only if it drifted from the detection
+        self.tracker_budget = 0.02  # seconds per tracker update before downgrading the backend
+        self.tracker_scale = 0.5  # frame scale fed to the tracker, None adapts it to the target size
+        self.tracker_backend = None  # pins one tracker backend, None lets the budget pick it
+        self.video_delay = 0.1  # seconds a frame is older than the state packet received with it
+        # keeps person identities across yolo syncs, the autopilot follows target_id
+        self.multi_tracker = MultiObjectTracker()
+        self.target_id = None
+        # appearance of the locked target, used to pick it out again after a track loss
+        self.target_signature = AppearanceSignature()
+        self.reid_min_similarity = 0.6
+        self.reid_timeout = 5  # seconds after which any person is accepted again
+        self.lost_since = clock()
+        # smooths the target box and predicts it to the time the rc command arrives
+        self.box_filter = BoxKalmanFilter()
+        self.command_latency = 0.15  # seconds from sending an rc command to the drone acting on it
+        # steers on box_filter at a fixed rate, independent of the frame loop
+        self.follow_controller = FollowController(
+            self.drone, command_latency=self.command_latency, clock=clock
+        )
+        # skips the haar cascade while the scene is static
+        self.face_gate = MotionGate(clock=clock)
+        # F12 samples all threads until pressed again, reports go to profiles/
+        self.profiler = SamplingProfiler()
+        # capture and inference in their own processes, frames shared through shared memory
+        self.processes = processes
+        self.pipeline = None
         logger.info("Game Initialized")
 
     def initialzeYolo(self):
         if not self.yolo_initialized:
-            self.yolo = Yolo()
-            self.yolo.initializeModel()
+            if self.pipeline is not None:
+                # same detect() call, answered by the inference process
+                self.yolo = self.pipeline.detector
+            else:
+                self.yolo = Yolo()
+                self.yolo.motion_gate.clock = self.clock
+                self.yolo.initializeModel()
             self.yolo_initialized = True
 
     def initalizeTracker(self):
         if not self.tracker_initialized:
-            self.tracker = cv2.TrackerKCF().create()
+            if self.tracker_backend is not None:
+                selector = TrackerSelector(order=(self.tracker_backend,))
+            else:
+                selector = TrackerSelector(budget=self.tracker_budget, initial="KCF")
+            # yaw compensation inside the scaling, the frame is shifted after the downscale
+            self.tracker = ScaledTracker(EgoMotionTracker(selector), scale=self.tracker_scale)
             self.tracker_initialized = True
 
     def initializeFaceFinder(self):
         if not self.face_finder_initialized:
-            self.face_cascade = cv2.CascadeClassifier(
-                "haarcascade_frontalface_default.xml"
+            # searches near the last face at half resolution, full scan on misses
+            self.face_detector = FaceDetector(
+                roi_scale=self.face_scale, full_scales=(self.face_scale,)
             )
             self.face_finder_initialized = True
 
-    def resinitalizeTracker(self):
-        del self.tracker
-        self.tracker_initialized = False
-        self.initalizeTracker()
-
     def run(self):
 
         if not self.drone.tello.connect():
@@ -131,36 +331,98 @@ class Game(object):
             logger.error("Could not start video stream")
             return
 
-        frame_read = self.drone.tello.get_frame_read()
+        if self.processes:
+            self.pipeline = ProcessPipeline(
+                self.drone.tello.get_udp_video_address(), tello=self.drone.tello, face_scale=self.face_scale
+            )
+            frame_read = self.pipeline.start().frame_read
+        else:
+            frame_read = self.drone.tello.get_frame_read()
+        self.follow_controller.start()
+        if self.server is not None:
+            self.server.start()
         self.should_stop = False
         while not self.should_stop:
-            self.image = frame_read.frame
-            # self.image = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
-            events = sdl2.ext.get_events()
-            for event in events:
-                if event.type == sdl2.SDL_KEYDOWN:
-                    key = event.key.keysym.sym
-                    self.key_down(key)
-                elif event.type == sdl2.SDL_KEYUP:
-                    key = event.key.keysym.sym
-                    self.key_up(key)
+            loop_start = time.perf_counter()
+            tick_start = self.clock()
+            self.frame_id, self.image, self.frame_time = frame_read.read_stamped()
+            metrics.observe("frame_age", time.time() - self.frame_time)
+            self.overlay.clear()
+            self.handleEvents()
             if frame_read.stopped:
                 frame_read.stop()
                 break
             if self.mode != None:
-                self.mode_updates()
-                self.printMode()
+                self.mode_updates(tick_start)
             self.update()
-            self.addStatustoImg()
-            self.image = cv2.flip(self.image, 1)
-            self.image = numpy.insert(self.image, 3, 255, axis=2)  # add alpha
-            self.image = numpy.rot90(self.image)  # rotate dims
-            numpy.copyto(self.windowArray, self.image)
-            self.window.refresh()
+            with metrics.timer("hud"):
+                if self.mode != None:
+                    self.printMode()
+                self.addStatustoImg()
+                self.addFollowStatustoImg()
+            with metrics.timer("display"):
+                self.display.show(self.image, self.overlay)
+                if self.window is not None:
+                    self.window.refresh()
+            metrics.observe("loop", time.perf_counter() - loop_start)
+            metrics.maybe_log()
             # time.sleep(1/self.FPS)
 
+        self.follow_controller.stop()
+        self.profiler.stop()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        if self.server is not None:
+            self.server.stop()
         self.drone.tello.end()
 
+    def handleEvents(self):
+        if self.headless:
+            while not self.control_events.empty():
+                event, key = self.control_events.get_nowait()
+                if event == "down":
+                    self.key_down(key)
+                else:
+                    self.key_up(key)
+            return
+        events = sdl2.ext.get_events()
+        for event in events:
+            if event.type == sdl2.SDL_KEYDOWN:
+                key = event.key.keysym.sym
+                self.key_down(key)
+            elif event.type == sdl2.SDL_KEYUP:
+                key = event.key.keysym.sym
+                self.key_up(key)
+
+    def control(self, key_name, event):
+        """
+        Control api of the headless mode, called from the server threads.
+        The key is queued and handled by the main loop like a window key event.
+        """
+        key = sdl2.SDL_GetKeyFromName(key_name.encode())
+        if key == sdl2.SDLK_UNKNOWN:
+            return False
+        self.control_events.put((event, key))
+        return True
+
+    def status(self):
+        """Current state for the headless status endpoint"""
+        return {
+            "mode": self.mode,
+            "frame_id": self.frame_id,
+            "state": self.drone.tello.get_last_state(),
+            "rc_control": self.drone.send_rc_control,
+            "velocities": {
+                "left_right": self.drone.left_right_velocity,
+                "for_back": self.drone.for_back_velocity,
+                "up_down": self.drone.up_down_velocity,
+                "yaw": self.drone.yaw_velocity,
+            },
+            "following": self.follow_controller.active,
+            "target_id": self.target_id,
+            "display_time": self.display.avg_time,
+        }
+
     def key_down(self, key):
         """ Update velocities based on key pressed
         Arguments:
@@ -209,9 +471,7 @@ class Game(object):
             logger.info("Land")
             self.drone.send_rc_control = False
         elif key == sdl2.SDLK_b:  # go to ground
-            self.drone.tello.go_to_ground()
-            logger.info("Got to Ground")
-            self.drone.send_rc_control = False
+            self.setMode(GO_TO_GROUND)
         elif key == sdl2.SDLK_k:  # Manual land and kill motors
             self.drone.tello.emergency_land()
             logger.info("Emmergency land")
@@ -221,191 +481,290 @@ class Game(object):
             time.sleep(3)
             self.should_stop = True
         elif key == sdl2.SDLK_p:
-            if self.mode == None:
-                self.mode = "Person follow"
-                self.detected = False
-            elif self.mode == "Person follow":
-                self.drone.setZero()
-                self.mode = None
-            self.drone.send_rc_control = False
+            self.toggleMode(PERSON_FOLLOW)
         elif key == sdl2.SDLK_f:
-            if self.mode == None:
-                self.mode = "Face follow"
-                self.detected = False
-            elif self.mode == "Face follow":
-                self.drone.setZero()
-                self.mode = None
-            self.drone.send_rc_control = False
+            self.toggleMode(FACE_FOLLOW)
         elif key == sdl2.SDLK_o:
-            if self.mode == None:
-                self.mode = "Aquire Face"
-                self.detected = False
-            elif self.mode == "Aquire Face" or self.mode == "Face follow":
-                self.drone.setZero()
-                self.mode = None
-            self.drone.send_rc_control = False
+            self.toggleMode(AQUIRE_FACE, also_stops=(FACE_FOLLOW,))
+        elif key == sdl2.SDLK_F12:
+            self.toggleProfiler()
+
+    def toggleProfiler(self):
+        """Starts or stops a profiling session, returns the report path when stopping"""
+        report = self.profiler.toggle()
+        if report is None:
+            logger.info("Profiler started")
+        else:
+            logger.info("Profiler report : {}".format(report))
+            print("Profiler report : {}".format(report))
+        return report
+
+    def toggleMode(self, mode, also_stops=()):
+        """Starts mode when no mode is active, stops it (or one of also_stops) otherwise"""
+        if self.mode == None:
+            new_mode = mode
+        elif self.mode == mode or self.mode in also_stops:
+            new_mode = None
+        else:
+            # another mode (e.g. the descent) keeps running and steering
+            return
+        # manual rc stops here, a mode that steers through Drone.update enables it in enter()
+        self.drone.send_rc_control = False
+        self.setMode(new_mode)
+
+    def setMode(self, mode):
+        if mode == self.mode:
+            return
+        if self.mode != None:
+            self.modes[self.mode].exit()
+        logger.info("Mode : {} -> {}".format(self.mode, mode))
+        self.mode = mode
+        if mode != None:
+            self.modes[mode].enter()
+
+    def logGateStats(self):
+        if self.pipeline is not None:
+            logger.info("Inference process : {}".format(self.pipeline.stats()))
+        elif self.yolo_initialized:
+            logger.info("Yolo motion gate : {}".format(self.yolo.motion_gate.stats()))
+        logger.info("Face motion gate : {}".format(self.face_gate.stats()))
+        if self.face_finder_initialized:
+            logger.info("Face detector : {}".format(self.face_detector.stats()))
+        logger.info("Overlay : {}".format(self.overlay.stats()))
 
     def printMode(self):
-        cv2.putText(
-            img=self.image,
-            text="Mode : {}".format(self.mode),
-            org=(100, 20),
-            fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-            fontScale=0.20 * 5,
-            color=(255, 0, 0),
+        self.overlay.text(
+            "Mode : {}".format(self.mode), (100, 20), (255, 0, 0), scale=0.20 * 5
         )
 
-    def mode_updates(self):
-        if self.mode == "Person follow":
-            return self.aquire_lock_person()
-        if self.mode == "Face follow":
-            return self.aquire_lock_face()
-        if self.mode == "Aquire facce":
-            return self.aquire_face()
-
-    def mark_box(self, bbox):
-        p1 = (int(bbox[0]), int(bbox[1]))
-        p2 = (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3]))
-        self.image = cv2.rectangle(self.image, p1, p2, (255, 0, 0), 2, 1)
+    def mode_updates(self, tick_start=None):
+        """Ticks the mode, the budget counts from tick_start (clock time the loop iteration started)"""
+        if tick_start is None:
+            tick_start = self.clock()
+        self.tick_deadline = tick_start + self.tick_budget
+        self.setMode(self.modes[self.mode].tick())
+        if self.tickTimeLeft() < 0:
+            logger.debug("Mode {} over tick budget by {:.3f}s".format(self.mode, -self.tickTimeLeft()))
 
-    def aquire_face(self):
-        self.drone.tello.go_to_height(80)
+    def tickTimeLeft(self):
+        """Seconds left of the current tick budget"""
+        return self.tick_deadline - self.clock()
 
-        face_detected = False
-        while not face_detected:
-            gray_img = cv2.cvtColor(self.image, cv2.COLOR_RGB2GRAY)
-            self.drone.yaw_velocity = self.drone.S
-            faces = self.face_cascade.detectMultiScale(gray_img, 1.3, 5)
-            if len(faces) > 0:
-                face_detected = True
-                self.mode = "Face follow"
+    def mark_box(self, bbox):
+        self.overlay.rectangle(bbox, (255, 0, 0), 2)
 
     def aquire_lock_person(self):
         bbox = None
+        detections = None
         self.initialzeYolo()
         self.initalizeTracker()
-        time_now = time.time()
-        do_sync = (
-            True
-            if ((time_now - self.yolo_tracker_last_sync) > self.yolo_tracker_sync_time)
-            else False
-        )
-        if not self.detected or do_sync:
-            boxes, conf, classes, self.image = self.yolo.detect(
-                self.image, self.follow_obj, return_img=True
-            )
-            if len(boxes) > 0:
-                self.yolo_tracker_last_sync = time.time()
-                bbox = boxes[0]
-                self.detected = True
-                self.resinitalizeTracker()
-                self.tracker.init(self.image, (bbox[0], bbox[1], bbox[2], bbox[3]))
-        else:
-            ok, bbox = self.tracker.update(self.image)
+        time_now = self.clock()
+        if self.detected:
+            with metrics.timer("tracking"):
+                ok, bbox = self.tracker.update(self.image, yaw=self.frameYaw())
             if ok:
-                self.mark_box(bbox)
-                self.calculateFollowCommands(bbox=bbox, adj_axis=[1, 0, 0])
+                self.multi_tracker.update_track(self.target_id, bbox, self.frame_time)
+                self.box_filter.correct(bbox, self.frame_time)
             else:
                 self.detected = False
+                self.lost_since = time_now
+                bbox = None
+        if not self.detected or self.redetect.should_redetect(
+            time_now, self.tracker.confidence, bbox, self.image
+        ):
+            with metrics.timer("detection"):
+                # while tracking, the scheduler asks because the tracker result is doubtful,
+                # a result the motion gate kept from before would not tell anything new
+                detections = self.yolo.detect(
+                    self.image, self.follow_obj, frame_id=self.frame_id, force=self.detected
+                )
+            # None while the inference process is busy, the tracker keeps following meanwhile
+            if detections is not None:
+                if self.detected:
+                    logger.info("Re-detecting : {}".format(self.redetect.reason))
+                self.associateDetections(detections[0], bbox, time_now)
+        self.followPrediction(adj_axis=[1, 0, 0])
+        if detections is not None:
+            boxes, conf, classes = detections
+            self.overlay.detections(boxes, conf, classes)
+        if bbox is not None:
+            self.mark_box(bbox)
+
+    def associateDetections(self, boxes, bbox, time_now):
+        """Matches the detected boxes to the tracks and (re)locks on the target, bbox is the tracker's box"""
+        image, frame_time = self.detectionFrame()
+        with metrics.timer("association"):
+            # same time base as update_track, the track velocities are per frame time
+            tracks = self.multi_tracker.update(boxes, frame_time)
+        target = self.selectTarget(tracks, time_now, image)
+        if target is not None:
+            if target.id != self.target_id:
+                logger.info("Following person {}".format(target.id))
+                self.box_filter.reset()
+            self.target_id = target.id
+            self.target_signature.update(image, target.bbox)
+            self.redetect.detected(target.bbox, time_now)
+            # keep the running tracker when it still agrees with the detection
+            if not self.detected or iou(bbox, target.bbox) < self.tracker_reinit_iou:
+                self.tracker.init(image, target.bbox, yaw=self.frameYaw(frame_time))
+            self.detected = True
+            self.box_filter.correct(target.bbox, frame_time)
+        elif self.detected:
+            # target not seen by yolo this time, keep following the tracker
+            self.redetect.detected(bbox, time_now)
+
+    def detectionFrame(self):
+        """
+        Image and time of the frame the detections belong to. With the process
+        pipeline that is an older frame than the current one, picked up from the
+        frame bus (RemoteDetector drops results whose frame is gone).
+        """
+        if self.pipeline is None:
+            return self.image, self.frame_time
+        return self.pipeline.detector.frame, self.pipeline.detector.frame_time
+
+    def frameYaw(self, frame_time=None):
+        """Drone yaw at the time the current frame (or the one at frame_time) was captured"""
+        frame_time = self.frame_time if frame_time is None else frame_time
+        return self.drone.tello.get_yaw_at(frame_time - self.video_delay)
+
+    def selectTarget(self, tracks, time_now, image):
+        """
+        Returns the track to follow: the current target if it was detected again,
+        after a loss the person looking most like the target, and the first
+        person when no target was locked yet.
+        """
+        detected = [track for track in tracks if track.matched]
+        for track in detected:
+            if track.id == self.target_id:
+                return track
+        if self.detected or len(detected) == 0:
+            return None
+        if self.target_signature.hist is None:
+            return detected[0]
+        similarity, best = self.target_signature.rank(
+            image, [track.bbox for track in detected]
+        )[0]
+        # give up on the old target after reid_timeout and take the best match
+        if (
+            similarity >= self.reid_min_similarity
+            or time_now - self.lost_since > self.reid_timeout
+        ):
+            logger.info(
+                "Re-identified target as person {} (similarity {:.2f})".format(
+                    detected[best].id, similarity
+                )
+            )
+            if similarity < self.reid_min_similarity:
+                # someone else after the timeout, their appearance replaces the old target's
+                self.target_signature.set(image, detected[best].bbox)
+            return detected[best]
+        return None
 
     def aquire_lock_face(self):
         bbox = None
         self.initializeFaceFinder()
-        gray_img = cv2.cvtColor(self.image, cv2.COLOR_RGB2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray_img, 1.3, 5)
+        with metrics.timer("detection"):
+            faces = self.findFaces()
         if len(faces) > 0:
             bbox = faces[0]
             bbox = (bbox[0], bbox[1], bbox[2], bbox[3])
-            self.calculateFollowCommands(bbox=bbox, adj_axis=[1, 1, 1])
+            self.box_filter.correct(bbox, self.detectionFrame()[1])
+            self.followPrediction(adj_axis=[1, 1, 1])
             self.mark_box(bbox)
-        else:
+        elif not self.followPrediction(adj_axis=[1, 1, 1]):
             self.drone.setZero()
 
-    def calculateFollowCommands(self, bbox, adj_axis):
-        if bbox != None:
-            image_shape = (self.image.shape[1] // 2, self.image.shape[0] // 2)
-            bbox_center = ((bbox[0] + (bbox[2] / 2)), (bbox[1] + (bbox[3] / 2)))
-            bbox_area = bbox[2] * bbox[3]
+    def followPrediction(self, adj_axis):
+        """
+        Hands the current target estimate to the follow controller, which steers on
+        it predicted to the time the command reaches the drone. Returns False when
+        there is no recent enough measurement to predict from.
+        """
+        arrival = self.clock() + self.command_latency
+        if not self.box_filter.can_coast(arrival):
+            self.follow_controller.clear_target()
+            return False
+        self.follow_controller.set_target(
+            self.box_filter.copy(), adj_axis, (self.image.shape[1], self.image.shape[0])
+        )
+        return True
 
-            if adj_axis[0] == 1:
-                self.drone.yaw_velocity = int(
-                    (bbox_center[0] - image_shape[0]) * self.drone.S / image_shape[0]
-                )
-                cv2.putText(
-                    img=self.image,
-                    text="drone yaw vel : {}".format(self.drone.yaw_velocity),
-                    org=(0, 150),
-                    fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-                    fontScale=0.15 * 5,
-                    color=(255, 0, 0),
-                )
+    def findFaces(self):
+        """Faces in the current frame, from the inference process when the pipeline runs"""
+        if self.pipeline is not None:
+            # gated in the inference process, [] until a new result arrives
+            return self.pipeline.detector.detect_faces(self.frame_id)
+        return self.face_gate.run(self.image, self.detectFaces)
 
-            if adj_axis[1] == 1:
-                self.drone.up_down_velocity = int(
-                    (bbox_center[1] - image_shape[1]) * self.drone.S / image_shape[1]
-                )
-                cv2.putText(
-                    img=self.image,
-                    text="drone up-down vel : {}".format(self.drone.up_down_velocity),
-                    org=(0, 170),
-                    fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-                    fontScale=0.15 * 5,
-                    color=(255, 0, 0),
-                )
+    def detectFaces(self, image):
+        return self.face_detector.detect(image)
 
-            if adj_axis[2] == 1:
-                desired_area = 10000
-                self.drone.for_back_velocity = int(
-                    self.drone.S
-                    * (desired_area - bbox_area)
-                    / max(desired_area, bbox_area)
-                )
-                cv2.putText(
-                    img=self.image,
-                    text="drone for-back vel : {}".format(self.drone.for_back_velocity),
-                    org=(0, 190),
-                    fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-                    fontScale=0.15 * 5,
-                    color=(255, 0, 0),
+    def addFollowStatustoImg(self):
+        if not self.follow_controller.active:
+            return
+        labels = (
+            ("yaw", "drone yaw vel : {}", 150),
+            ("up_down", "drone up-down vel : {}", 170),
+            ("for_back", "drone for-back vel : {}", 190),
+        )
+        for (axis, text, y), enabled in zip(labels, self.follow_controller.adj_axis):
+            if enabled:
+                self.overlay.text(
+                    text.format(self.follow_controller.outputs[axis]), (0, y), (255, 0, 0)
                 )
-                self.drone.send_rc_control = True
 
     def addStatustoImg(self):
-        cv2.putText(
-            img=self.image,
-            text="Height : {}".format(self.drone.tello.get_tello_status().h),
-            org=(0, 50),
-            fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-            fontScale=0.15 * 5,
-            color=(255, 255, 255),
-        )
-        cv2.putText(
-            img=self.image,
-            text="Battery : {}".format(self.drone.tello.get_tello_status().bat),
-            org=(0, 70),
-            fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-            fontScale=0.15 * 5,
-            color=(255, 255, 255),
-        )
-        cv2.putText(
-            img=self.image,
-            text="Temp : {} - {}".format(
-                self.drone.tello.get_tello_status().temph,
-                self.drone.tello.get_tello_status().templ,
-            ),
-            org=(0, 90),
-            fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-            fontScale=0.15 * 5,
-            color=(255, 255, 255),
+        status = self.drone.tello.get_tello_status()
+        self.overlay.text("Height : {}".format(status.h), (0, 50), (255, 255, 255))
+        self.overlay.text("Battery : {}".format(status.bat), (0, 70), (255, 255, 255))
+        self.overlay.text(
+            "Temp : {} - {}".format(status.temph, status.templ), (0, 90), (255, 255, 255)
         )
 
     def update(self):
         """ Update routine. Send velocities to Tello."""
-        self.drone.update()
+        # while following, the controller thread sends the rc commands
+        if not self.follow_controller.active:
+            self.drone.update()
 
 
 def main():
-    game = Game()
+    parser = argparse.ArgumentParser(description="Tello autopilot")
+    parser.add_argument(
+        "--headless", action="store_true", help="no window, serve video and controls over http"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="address of the headless server")
+    parser.add_argument("--port", type=int, default=8080, help="port of the headless server")
+    parser.add_argument(
+        "--token", help="bearer token for the control api, required when --host is not loopback"
+    )
+    parser.add_argument(
+        "--metrics",
+        type=int,
+        metavar="PORT",
+        help="record stage latencies, serve them on http://host:PORT/metrics and log them to metrics.log",
+    )
+    parser.add_argument(
+        "--record", metavar="DIR", help="record frames, telemetry and commands of the flight into DIR"
+    )
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="decode video and run detection in separate processes, frames shared through shared memory",
+    )
+    args = parser.parse_args()
+    if args.metrics is not None:
+        metrics.enable().serve(args.host, args.metrics)
+    game = Game(
+        headless=args.headless,
+        host=args.host,
+        port=args.port,
+        processes=args.processes,
+        token=args.token,
+    )
+    if args.record:
+        game.drone.tello.start_recording(args.record)
     game.run()
 
 
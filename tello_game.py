@@ -7,6 +7,10 @@ import time
 import timeit
 from PIL import ImageFont, ImageDraw, Image
 from ImageProcessing.yolov3 import Yolo
+from ImageProcessing.trackers import ScaledTracker, TrackerSelector
+from ImageProcessing.display import RGBDisplay
+from ImageProcessing.overlay import Overlay
+from djitellopy.profiler import SamplingProfiler
 
 face_cascade = cv2.CascadeClassifier("haarcascade_frontalface_default.xml")
 
@@ -49,6 +53,7 @@ class FrontEnd(object):
             - K: Emergency Land
             - Q: Emergency Motor Kill
             - F: Face Follow mode
+            - F12: Start/stop the profiler
     """
 
     def __init__(self):
@@ -58,6 +63,9 @@ class FrontEnd(object):
         # Creat pygame window
         pygame.display.set_caption("Tello video stream")
         self.screen = pygame.display.set_mode([960, 720])
+        self.display = RGBDisplay(lambda: pygame.surfarray.pixels3d(self.screen))
+        # HUD and tracker box, drawn on the displayed copy so the shared frame stays clean
+        self.overlay = Overlay()
 
         # Init Tello object that interacts with the Tello drone
         self.tello = Tello()
@@ -72,9 +80,11 @@ class FrontEnd(object):
         self.send_rc_control = False
         self.yolo = Yolo()
         self.yolo.initializeModel()
-        self.tracker = tracker = cv2.TrackerCSRT().create()
+        # CSRT is only real-time on slow hosts when run at half resolution
+        self.tracker = ScaledTracker(TrackerSelector(budget=0.05, initial="CSRT"), scale=0.5)
         self.locked = False
         self.locked_frame = None
+        self.profiler = SamplingProfiler()
 
         # create update timer
         pygame.time.set_timer(USEREVENT + 1, 50)
@@ -110,7 +120,8 @@ class FrontEnd(object):
             for event in pygame.event.get():
                 if event.type == USEREVENT + 1:
                     if self.mode != None:
-                        frame_read.frame = self.get_update(frame_read.frame)
+                        frame_id, frame = frame_read.read()
+                        self.get_update(frame, frame_id)
                     self.update()
                 elif event.type == QUIT:
                     should_stop = True
@@ -126,43 +137,21 @@ class FrontEnd(object):
                 frame_read.stop()
                 break
 
-            self.screen.fill([0, 0, 0])
-            frame = cv2.cvtColor(frame_read.frame, cv2.COLOR_BGR2RGB)
-            cv2.putText(
-                img=frame,
-                text="Height : {}".format(self.tello.get_tello_status().h),
-                org=(0, 50),
-                fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-                fontScale=0.15 * 5,
-                color=(255, 255, 255),
+            status = self.tello.get_tello_status()
+            self.overlay.clear()
+            self.overlay.text("Height : {}".format(status.h), (0, 50), (255, 255, 255))
+            self.overlay.text("Battery : {}".format(status.bat), (0, 70), (255, 255, 255))
+            self.overlay.text(
+                "Temp : {} - {}".format(status.temph, status.templ), (0, 90), (255, 255, 255)
             )
-            cv2.putText(
-                img=frame,
-                text="Battery : {}".format(self.tello.get_tello_status().bat),
-                org=(0, 70),
-                fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-                fontScale=0.15 * 5,
-                color=(255, 255, 255),
-            )
-            cv2.putText(
-                img=frame,
-                text="Temp : {} - {}".format(
-                    self.tello.get_tello_status().temph,
-                    self.tello.get_tello_status().templ,
-                ),
-                org=(0, 90),
-                fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-                fontScale=0.15 * 5,
-                color=(255, 255, 255),
-            )
-            frame = np.rot90(frame)
-            frame = np.flipud(frame)
-            frame = pygame.surfarray.make_surface(frame)
-            self.screen.blit(frame, (0, 0))
+            if self.mode == "Follow" and self.locked_frame is not None:
+                self.overlay.rectangle(self.locked_frame, (255, 125, 0), 2)
+            self.display.show(frame_read.frame, self.overlay)
             time.sleep((1 / FPS))
             pygame.display.update()
             self.tello.get_tello_status()
 
+        self.profiler.stop()
         # Call it always before finishing. I deallocate resources.
         self.tello.end()
 
@@ -230,6 +219,9 @@ class FrontEnd(object):
             self.tello.emergency_land()
             logger.info("Emmergency land")
             self.send_rc_control = False
+        elif key == pygame.K_F12:  # start/stop profiling, reports go to profiles/
+            report = self.profiler.toggle()
+            logger.info("Profiler {}".format("started" if report is None else "report : " + report))
         # elif key ==pygame.K_q:
         #     self.tello.emergency()
         #     logger.info("Kill motors")
@@ -245,9 +237,9 @@ class FrontEnd(object):
                 self.yaw_velocity,
             )
 
-    def get_update(self, frame_read):
+    def get_update(self, frame_read, frame_id=None):
         if self.mode == "Aquire lock":
-            return self.aquire_lock(frame_read)
+            return self.aquire_lock(frame_read, frame_id)
         if self.mode == "Follow":
             return self.follow(frame_read)
 
@@ -274,8 +266,8 @@ class FrontEnd(object):
         )
         return frame_read
 
-    def aquire_lock(self, frame):
-        bbox, _, _ = self.yolo.detect(frame, "person")
+    def aquire_lock(self, frame, frame_id=None):
+        bbox, _, _ = self.yolo.detect(frame, "person", frame_id=frame_id)
         if len(bbox) > 0:
             self.locked = True
             self.locked_frame = [int(i) for i in bbox[0]]
@@ -300,16 +292,6 @@ class FrontEnd(object):
         logger.info("Locked Frame : {}".format(self.locked_frame))
         if ok:
             self.calcMovementVector(frame_shape, self.locked_frame)
-            cv2.rectangle(
-                frame_read,
-                (int(self.locked_frame[0]), self.locked_frame[1]),
-                (
-                    self.locked_frame[0] + self.locked_frame[2],
-                    self.locked_frame[1] + self.locked_frame[3],
-                ),
-                (255, 125, 0),
-                2,
-            )
         else:
             self.mode = "Aquire Lock"
             self.locked = False
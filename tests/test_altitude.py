@@ -0,0 +1,36 @@
+from djitellopy.tello import AltitudeTarget
+
+
+def state(h, tof=100, vgz=0, t=0):
+    return {"h": h, "tof": tof, "vgz": vgz, "time": t}
+
+
+def test_ground_uses_distance_sensor():
+    target = AltitudeTarget.to_ground(speed=40)
+    assert target.step(state(60, tof=80)) == -40
+    # the barometric height drifted, the distance sensor already sees the ground
+    assert target.step(state(45, tof=25, t=1)) == 0
+    assert not target.reached
+    assert target.step(state(45, tof=24, t=2)) == 0
+    assert target.reached
+
+
+def test_settles_on_new_packets_only():
+    target = AltitudeTarget.to_height(80)
+    packet = state(78, vgz=0)
+    # the game loop ticks faster than the 10Hz telemetry, the same packet comes in again
+    for _ in range(5):
+        assert target.step(packet) == 0
+    assert not target.reached
+    assert target.step(state(79, vgz=0, t=1)) == 0
+    assert target.reached
+
+
+def test_still_moving_is_not_reached():
+    target = AltitudeTarget.to_height(80, min_speed=15)
+    assert target.step(state(40)) > 0
+    assert target.step(state(79, vgz=-5, t=1)) == 0
+    assert target.step(state(80, vgz=-3, t=2)) == 0
+    assert not target.reached
+    assert target.step(state(60, t=3)) == 15  # overshot back down, min_speed moves it at all
+    assert not target.reached
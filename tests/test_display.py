@@ -0,0 +1,46 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from ImageProcessing.display import BGRADisplay
+
+
+def surface(width, height):
+    """Stand-in for a 32 bit surface array, indexed [x][y] like sdl2.ext.pixels3d"""
+    return np.zeros((height, width, 4), dtype=np.uint8).transpose(1, 0, 2)
+
+
+def frame(width, height):
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[:, : width // 2] = (255, 0, 0)  # left half blue
+    image[:, width // 2 :, 2] = np.arange(height, dtype=np.uint8)[:, None]  # right half red ramp
+    return image
+
+
+def test_direct_write():
+    array = surface(64, 48)
+    display = BGRADisplay(array)
+    display.show(frame(64, 48))
+    shown = array.transpose(1, 0, 2)
+    assert display.zero_copy
+    assert tuple(shown[10, 0]) == (255, 0, 0, 255)
+    assert tuple(shown[10, 63]) == (0, 0, 10, 255)
+
+
+def test_mirror_write():
+    array = surface(64, 48)
+    display = BGRADisplay(array, mirror=True)
+    display.show(frame(64, 48))
+    display.show(frame(64, 48))  # reuses the scratch buffer
+    shown = array.transpose(1, 0, 2)
+    assert not display.zero_copy
+    assert tuple(shown[10, 63]) == (255, 0, 0, 255)
+    assert tuple(shown[10, 0]) == (0, 0, 10, 255)
+
+
+def test_mirror_resizes():
+    array = surface(32, 24)
+    display = BGRADisplay(array, mirror=True)
+    display.show(frame(64, 48))
+    assert tuple(array.transpose(1, 0, 2)[5, 31]) == (255, 0, 0, 255)
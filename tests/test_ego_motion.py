@@ -0,0 +1,35 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from ImageProcessing.ego_motion import TELLO_PIXELS_PER_DEGREE, EgoMotionTracker
+from ImageProcessing.trackers import ScaledTracker
+
+
+class StillTracker:
+    """Reports the init box on every update and keeps the frames it was given"""
+
+    def __init__(self):
+        self.frames = []
+
+    def init(self, frame, bbox):
+        self.bbox = bbox
+
+    def update(self, frame):
+        self.frames.append(frame)
+        return True, self.bbox
+
+
+def test_compensation_runs_at_tracker_scale():
+    inner = StillTracker()
+    tracker = ScaledTracker(EgoMotionTracker(inner), scale=0.5)
+    frame = np.zeros((720, 960, 3), dtype=np.uint8)
+    tracker.init(frame, (400, 300, 100, 100), yaw=10)
+    ok, bbox = tracker.update(frame, yaw=15)
+    assert ok
+    # the warp only ever sees the downscaled frame
+    assert [f.shape for f in inner.frames] == [(360, 480, 3)]
+    # yawing right by 5 degrees moves the target 5 degrees worth of full resolution pixels left
+    assert bbox[0] == pytest.approx(400 - 5 * TELLO_PIXELS_PER_DEGREE)
+    assert bbox[1:] == pytest.approx((300, 100, 100))
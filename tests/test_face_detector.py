@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from ImageProcessing.face_detector import FaceDetector
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_full_scan_without_roi():
+    frame = cv2.imread(os.path.join(ROOT, "ImageProcessing", "bird.jpg"))
+    assert frame is not None
+    detector = FaceDetector(cascade_file=os.path.join(ROOT, "haarcascade_frontalface_default.xml"))
+    assert detector.last_face is None
+    faces = detector.detect(frame)
+    assert isinstance(faces, list)
+    assert detector.stats()["full_scans"] == 1
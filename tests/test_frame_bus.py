@@ -0,0 +1,89 @@
+import queue
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from djitellopy.frame_bus import FrameBus
+from process_pipeline import YOLO, RemoteDetector
+
+
+@pytest.fixture
+def bus():
+    bus = FrameBus(slots=4, shape=(8, 8, 3))
+    yield bus
+    bus.close()
+
+
+def frame(value):
+    return np.full((8, 8, 3), value, dtype=np.uint8)
+
+
+def test_read_returns_a_copy_of_the_frame(bus):
+    seq = bus.write(frame(7), 100.0)
+    image, t = bus.read(seq)
+    assert seq == bus.latest == 1
+    assert t == 100.0 and (image == 7).all()
+    image[:] = 0
+    assert (bus.read(seq)[0] == 7).all()
+
+
+def test_overwritten_and_future_frames_are_gone(bus):
+    for i in range(1, 6):
+        bus.write(frame(i), float(i))
+    # 4 slots, frame 1 was overwritten by frame 5
+    assert bus.read(1) is None
+    assert bus.read(6) is None
+    assert bus.read(0) is None
+    assert bus.read(2)[1] == 2.0
+
+
+def test_frame_being_written_is_not_returned_torn(bus):
+    seq = bus.write(frame(1), 1.0)
+    bus.seqs[seq % bus.slots] = -1
+    assert bus.read(seq) is None
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_stale_results_are_dropped(bus):
+    requests, results = queue.Queue(), queue.Queue()
+    clock = Clock(1.0)
+    detector = RemoteDetector(bus, requests, results, max_age=0.5, clock=clock)
+    first = bus.write(frame(1), 1.0)
+    assert detector.take(YOLO, first) is None
+    assert requests.get_nowait() == (YOLO, first, False)
+    results.put((YOLO, first, 1.0, ["person"], 0.1))
+    # the tracker went on without detections, the next request comes much later
+    for i in range(2, 6):
+        bus.write(frame(i), float(i))
+    clock.now = 5.0
+    assert detector.take(YOLO, bus.latest) is None
+    assert detector.frame is None and detector.frame_time is None
+    assert detector.stats()["stale"] == 1
+    # the newer request went out meanwhile, its answer is used with its own frame and time
+    assert requests.get_nowait() == (YOLO, 5, False)
+    results.put((YOLO, 5, 5.0, ["person"], 0.1))
+    clock.now = 5.2
+    assert detector.take(YOLO, 5) == ["person"]
+    assert detector.frame_time == 5.0 and (detector.frame == 5).all()
+
+
+def test_result_whose_frame_was_overwritten_is_dropped(bus):
+    requests, results = queue.Queue(), queue.Queue()
+    clock = Clock(1.0)
+    detector = RemoteDetector(bus, requests, results, max_age=10.0, clock=clock)
+    first = bus.write(frame(1), 1.0)
+    detector.take(YOLO, first)
+    results.put((YOLO, first, 1.0, ["person"], 0.1))
+    for i in range(2, 6):
+        bus.write(frame(i), 1.0 + i / 30)
+    assert detector.take(YOLO, bus.latest) is None
+    assert detector.stats()["stale"] == 1
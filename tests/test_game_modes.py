@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("sdl2")
+
+from replay import ReplayClock, ReplayTello, Telemetry
+from tello_fast_game import AQUIRE_FACE, GO_TO_GROUND, PERSON_FOLLOW, Drone, Game
+
+
+@pytest.fixture
+def game():
+    clock = ReplayClock(100.0)
+    game = Game(headless=True, drone=Drone(tello=ReplayTello(Telemetry(), clock)), clock=clock)
+    game.face_calls = 0
+
+    def find_faces():
+        game.face_calls += 1
+        return []
+
+    game.findFaces = find_faces
+    return game
+
+
+def test_face_search_is_skipped_on_a_slow_tick(game):
+    game.setMode(AQUIRE_FACE)
+    game.modes[AQUIRE_FACE].state = "search"
+    tick_start = game.clock()
+    game.clock.now += 0.03
+    game.mode_updates(tick_start)
+    assert game.face_calls == 1
+    # frame read, detections and overlay already used up the budget of this iteration
+    tick_start = game.clock()
+    game.clock.now += game.tick_budget + 0.01
+    game.mode_updates(tick_start)
+    assert game.face_calls == 1
+
+
+def test_follow_keys_do_not_stop_the_descent(game):
+    game.setMode(GO_TO_GROUND)
+    assert game.drone.send_rc_control
+    game.toggleMode(PERSON_FOLLOW)
+    assert game.mode == GO_TO_GROUND
+    assert game.drone.send_rc_control
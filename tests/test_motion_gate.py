@@ -0,0 +1,52 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from ImageProcessing.motion_gate import MotionGate
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Detector:
+    def __init__(self):
+        self.runs = 0
+
+    def __call__(self, frame):
+        self.runs += 1
+        return self.runs
+
+
+def static_frame():
+    return np.full((48, 64, 3), 100, dtype=np.uint8)
+
+
+def test_static_scene_is_reused():
+    gate, detect = MotionGate(clock=Clock()), Detector()
+    assert gate.run(static_frame(), detect) == 1
+    assert gate.run(static_frame(), detect) == 1
+    assert detect.runs == 1
+
+
+def test_force_bypasses_the_gate():
+    gate, detect = MotionGate(clock=Clock()), Detector()
+    gate.run(static_frame(), detect)
+    assert gate.run(static_frame(), detect, force=True) == 2
+    # the forced result is reused afterwards
+    assert gate.run(static_frame(), detect) == 2
+
+
+def test_reuse_is_bounded_by_time():
+    clock = Clock()
+    gate, detect = MotionGate(max_age=1.0, clock=clock), Detector()
+    gate.run(static_frame(), detect)
+    clock.now = 0.9
+    assert gate.run(static_frame(), detect) == 1
+    clock.now = 1.1
+    assert gate.run(static_frame(), detect) == 2
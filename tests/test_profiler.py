@@ -0,0 +1,10 @@
+import os
+
+from djitellopy.profiler import SamplingProfiler
+
+
+def test_report_before_the_first_session(tmp_path):
+    profiler = SamplingProfiler(output_dir=str(tmp_path))
+    assert profiler.report().startswith("duration 0.0s, 0 samples")
+    assert os.path.exists(profiler.dump())
+    assert profiler.stop() is None
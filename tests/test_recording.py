@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from djitellopy.recording import FlightRecorder, FlightRecording
+
+
+def state(yaw, drone_time):
+    return {"yaw": float(yaw), "h": 50.0, "bat": 80.0, "time": float(drone_time)}
+
+
+def test_round_trip(tmp_path):
+    directory = str(tmp_path / "flight")
+    recorder = FlightRecorder(directory)
+    recorder.record_state(state(10, 3), 100.0)
+    recorder.record_state(state(20, 4), 101.0)
+    recorder.record_command("command", 100.5)
+    recorder.record_frame(1, np.zeros((48, 64, 3), dtype=np.uint8), 100.2)
+    recorder.close()
+
+    assert os.listdir(os.path.join(directory, "telemetry")).count("time.f8") == 1
+    recording = FlightRecording(directory)
+    assert recording.start == 100.0
+    assert recording.end == 101.0
+    assert recording.state_at(100.7)["time"] == 3.0
+    assert recording.state_at(101.5)["yaw"] == 20.0
+    assert recording.state_at(99.0) == {}
+    assert recording.yaw_at(100.5) == pytest.approx(15.0)
+    assert recording.commands() == [(100.5, "command")]
+    frame_id, image, t = recording.frame(0)
+    assert (frame_id, image.shape, t) == (1, (48, 64, 3), 100.2)
@@ -0,0 +1,96 @@
+import http.client
+import json
+
+import pytest
+
+pytest.importorskip("cv2")
+
+from stream_server import StreamServer
+
+
+@pytest.fixture
+def server():
+    def make(token=None):
+        calls = []
+        control = lambda key, event: calls.append((key, event)) or True
+        server = StreamServer(lambda: {}, control, host="127.0.0.1", port=0, token=token).start()
+        server.calls = calls
+        started.append(server)
+        return server
+
+    started = []
+    yield make
+    for server in started:
+        server.stop()
+
+
+def request(server, method, headers=None, body=None, path="/control"):
+    connection = http.client.HTTPConnection(*server.httpd.server_address, timeout=5)
+    connection.request(method, path, body=body, headers=headers or {})
+    status = connection.getresponse().status
+    connection.close()
+    return status
+
+
+def post(server, headers=None):
+    headers = dict({"Content-Type": "application/json"}, **(headers or {}))
+    return request(server, "POST", headers, json.dumps({"key": "t", "event": "up"}))
+
+
+def test_json_post_is_accepted(server):
+    s = server()
+    assert post(s) == 200
+    assert s.calls == [("t", "up")]
+
+
+def test_get_is_rejected(server):
+    s = server()
+    assert request(s, "GET", path="/control?key=t&event=up") == 405
+    assert s.calls == []
+
+
+def test_simple_request_is_rejected(server):
+    s = server()
+    body = json.dumps({"key": "t", "event": "up"})
+    assert request(s, "POST", {"Content-Type": "text/plain"}, body) == 415
+    assert s.calls == []
+
+
+def test_foreign_origin_and_host_are_rejected(server):
+    s = server()
+    assert post(s, {"Origin": "http://evil.example"}) == 403
+    assert post(s, {"Host": "evil.example:8080"}) == 403
+    host = "127.0.0.1:{}".format(s.httpd.server_address[1])
+    assert post(s, {"Origin": "http://" + host}) == 200
+    assert s.calls == [("t", "up")]
+
+
+def test_token(server):
+    s = server(token="secret")
+    assert post(s) == 401
+    assert post(s, {"Authorization": "Bearer wrong"}) == 401
+    assert post(s, {"Authorization": "Bearer secret", "Host": "drone-station:8080"}) == 200
+    assert s.calls == [("t", "up")]
+
+
+def test_lan_address_needs_token():
+    with pytest.raises(ValueError):
+        StreamServer(lambda: {}, lambda key, event: True, host="0.0.0.0")
+
+
+def test_stream_and_status_need_the_token(server):
+    s = server(token="secret")
+    host = {"Host": "drone-station:8080"}
+    assert request(s, "GET", host, path="/status") == 401
+    assert request(s, "GET", host, path="/video") == 401
+    assert request(s, "GET", dict(host, Authorization="Bearer secret"), path="/status") == 200
+    assert request(s, "GET", host, path="/status?token=secret") == 200
+    assert request(s, "GET", host, path="/status?token=wrong") == 401
+    # the viewer page holds no data, it reads the token from the url fragment
+    assert request(s, "GET", host, path="/") == 200
+
+
+def test_status_without_token_only_on_loopback_names(server):
+    s = server()
+    assert request(s, "GET", path="/status") == 200
+    assert request(s, "GET", {"Host": "evil.example:8080"}, path="/status") == 403
@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip("cv2")
+
+from djitellopy.metrics import Metrics
+from djitellopy import tello as tello_module
+from djitellopy.tello import Tello
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def drone(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tello_module.time, "time", clock.time)
+    monkeypatch.setattr(tello_module, "metrics", Metrics().enable())
+    drone = Tello.__new__(Tello)  # no sockets, the datagrams are collected instead
+    drone.sent = []
+    drone.send_command_without_return = lambda command: drone.sent.append(command) or True
+    return drone, clock
+
+
+def test_rc_sends_are_spaced(drone):
+    drone, clock = drone
+    assert drone.send_rc_control(0, 0, 0, 10)
+    clock.now += Tello.TIME_BTW_RC_CONTROL_COMMANDS / 2
+    drone.send_rc_control(0, 0, 0, 20)
+    clock.now += Tello.TIME_BTW_RC_CONTROL_COMMANDS
+    assert drone.send_rc_control(0, 0, 0, 30)
+    assert drone.sent == ["rc 0 0 0 10", "rc 0 0 0 30"]
+    assert tello_module.metrics.summary()[1] == {"rc_sends_dropped": 1}
+
+
+def test_follow_rate_is_not_dropped(drone):
+    drone, clock = drone
+    for _ in range(10):
+        drone.send_rc_control(0, 0, 0, 0)
+        clock.now += 0.05  # FollowController default rate, 20Hz
+    assert len(drone.sent) == 10
@@ -0,0 +1,62 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+cv = pytest.importorskip("cv2")
+
+from ImageProcessing.trackers import KCFTracker, MOSSETracker, OpticalFlowTracker, TrackerSelector
+
+BOX = 40
+BACKGROUND = 90
+
+
+def texture():
+    rng = np.random.RandomState(0)
+    noise = cv.GaussianBlur(rng.randint(0, 256, (BOX, BOX, 3)).astype(np.uint8), (0, 0), 3)
+    return cv.normalize(noise, None, 0, 255, cv.NORM_MINMAX)
+
+
+def scene(x, target, occluded=0):
+    """The target at (x, 100), its left occluded columns covered by background"""
+    frame = np.full((240, 320, 3), BACKGROUND, dtype=np.uint8)
+    frame[100 : 100 + BOX, x : x + BOX] = target
+    frame[100 : 100 + BOX, x : x + occluded] = BACKGROUND
+    return frame
+
+
+@pytest.mark.parametrize("tracker_class", [KCFTracker, MOSSETracker, OpticalFlowTracker])
+def test_confidence_drops_with_degrading_target(tracker_class):
+    target = texture()
+    tracker = tracker_class()
+    tracker.init(scene(100, target), (100, 100, BOX, BOX))
+    for x in range(101, 106):
+        ok, _ = tracker.update(scene(x, target))
+        assert ok
+        assert tracker.confidence > 0.9
+    confidences = []
+    for occluded in (10, 20, 30, 40):
+        ok, _ = tracker.update(scene(105, target, occluded))
+        confidences.append(tracker.confidence if ok else 0.0)
+    assert confidences == sorted(confidences, reverse=True)
+    assert confidences[0] < 0.9
+    assert confidences[-1] < 0.5
+
+
+def test_selector_upgrades_on_low_confidence():
+    target = texture()
+    selector = TrackerSelector(budget=1.0, initial="FLOW")
+    selector.costs["MOSSE"] = 0.001  # known to fit the budget
+    selector.init(scene(100, target), (100, 100, BOX, BOX))
+    selector.update(scene(101, target))
+    assert selector.name == "FLOW"
+    selector.update(scene(101, target, 20))
+    assert selector.name == "MOSSE"
+
+
+def test_pinned_selector_ignores_the_budget():
+    # replays pin the backend, a slow machine must not change the commands
+    target = texture()
+    selector = TrackerSelector(budget=0.0, order=("KCF",))
+    selector.init(scene(100, target), (100, 100, BOX, BOX))
+    for x in range(101, 106):
+        selector.update(scene(x, target))
+    assert selector.name == "KCF"